@@ -9,23 +9,30 @@ DRY_RUN = 0
 # - id: unique instance id (for logs/audit)
 # - type: step type capability
 # - config: optional per-instance config path (relative to config dir)
+# - depends_on: optional upstream instance ids (default: previous entry);
+#   instances whose dependencies are done run concurrently
 #
 # This is the recommended form for modular, pluggable orchestration.
 STEPS = [
-    {"id": "tokenize_cpt_0", "type": "tokenize_cpt", "config": "steps/tokenize_cpt_0.py", "enabled": True},
-    {"id": "tokenize_sft_0", "type": "tokenize_sft", "config": "steps/tokenize_sft_0.py", "enabled": True},
-    {"id": "train_cpt_0", "type": "train_cpt", "config": "steps/train_cpt_0.py", "enabled": True},
-    {"id": "mg2hf_0", "type": "mg2hf", "config": "steps/mg2hf_0.py", "enabled": True},
-    {"id": "hf2mg_0", "type": "hf2mg", "config": "steps/hf2mg_0.py", "enabled": True},
-    {"id": "train_sft_0", "type": "train_sft", "config": "steps/train_sft_0.py", "enabled": True},
+    {"id": "tokenize_cpt_0", "type": "tokenize_cpt", "config": "steps/tokenize_cpt_0.py", "enabled": True, "depends_on": []},
+    {"id": "tokenize_sft_0", "type": "tokenize_sft", "config": "steps/tokenize_sft_0.py", "enabled": True, "depends_on": []},
+    {"id": "train_cpt_0", "type": "train_cpt", "config": "steps/train_cpt_0.py", "enabled": True, "depends_on": ["tokenize_cpt_0"]},
+    {"id": "mg2hf_0", "type": "mg2hf", "config": "steps/mg2hf_0.py", "enabled": True, "depends_on": ["train_cpt_0"]},
+    {"id": "hf2mg_0", "type": "hf2mg", "config": "steps/hf2mg_0.py", "enabled": True, "depends_on": ["mg2hf_0"]},
+    {"id": "train_sft_0", "type": "train_sft", "config": "steps/train_sft_0.py", "enabled": True, "depends_on": ["train_cpt_0", "tokenize_sft_0"]},
 ]
 
+# Max step instances run concurrently within one generation (0 = no limit)
+MAX_PARALLEL_STEPS = 0
+
 # Base model configuration (single source of truth)
 # BASE_MODEL_SRC: 原始模型路径，应直接指向包含 safetensors 的目录
 # prepare_exp 会将 BASE_MODEL_SRC 复制到 ${DATAPOOL_ROOT}/model/base/${BASE_MODEL_NAME}
 # 复制后，safetensors 文件直接在 ${DATAPOOL_ROOT}/model/base/${BASE_MODEL_NAME} 目录下
 BASE_MODEL_NAME = "Qwen3-1.7B"
 BASE_MODEL_SRC = "/home/unlimitediw/workspace/models/Qwen3-1.7B"
+# BASE_MODEL_MODE: copy（默认，reflink 不支持时内核拷贝，文件相互独立）| hardlink（与源共享 inode，修改会互相影响）| symlink（整个目录软链到源）
+BASE_MODEL_MODE = "copy"
 # BASE_MODEL_PATH: 实际模型在 datapool 中的路径（prepare_exp 后，供 steps 使用）
 # 这个路径直接指向包含 safetensors、config.json、tokenizer.json 等的目录
 # (defined in configs/common/pipeline_base.py)
@@ -1,2 +1,4 @@
 # HF → MG (atomic). SCRIPT runs the full conversion.
 SCRIPT = "echo hf2mg"
+# Reads mg2hf_0's intermediate HF checkpoint from the per-run handoff dir
+IN_HF_DIR = "${HANDOFF_DIR}/hf"
@@ -1,3 +1,6 @@
 # step5: MG -> HF size conversion (extern script)
 # SCRIPT: 编排层统一执行入口（可为外部 shell 命令）
 SCRIPT = "echo 5.mg2hf"
+# Intermediate HF checkpoint consumed only by hf2mg_0: write it to the per-run
+# tmpfs handoff dir (removed when the run ends) instead of datapool
+OUT_HF_DIR = "${HANDOFF_DIR}/hf"
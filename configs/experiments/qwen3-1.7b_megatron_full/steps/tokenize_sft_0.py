@@ -12,6 +12,14 @@ PROMPT_RESPONSE_PREFIX = "### Response:\n"
 JSON_KEYS = "text"
 MEGATRON = "${MEGATRON}"
 WORKERS = 32
-PARTITIONS = 1
+# auto: nproc // WORKERS_PER_PARTITION partitions, each tokenized by its own
+# preprocess process with WORKERS // PARTITIONS workers
+PARTITIONS = "auto"
+WORKERS_PER_PARTITION = 16
 LOG_INTERVAL = 100000
 TOKENIZER_TYPE = "HuggingFaceTokenizer"
+# 1: skip preprocess_data.py when <OUTPUT_PREFIX>.cachekey matches inputs/tokenizer/params
+TOKENIZE_CACHE = 1
+# 1: after tokenize (or cache hit) read the .bin/.idx outputs into page cache for the
+#    train step (capped at 50% of MemAvailable); set 0 on low-RAM hosts
+PRELOAD_BIN = 1
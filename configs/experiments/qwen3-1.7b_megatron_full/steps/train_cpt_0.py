@@ -1,7 +1,7 @@
 # step4: NVIDIA CPT (e.g. Megatron-DeepSpeed pretrain_gpt.py)
-# RUN_WITH=cmd → run TRAIN_CMD (set below). RUN_WITH=entrypoint → run python ENTRYPOINT ARGS. No default.
+# RUN_WITH=argv → run TRAIN_LAUNCHER TRAIN_ENTRY TRAIN_ARGS (no shell). RUN_WITH=cmd → TRAIN_CMD. RUN_WITH=entrypoint → python ENTRYPOINT ARGS. No default.
 SCRIPT = "python3 ${ROOT_DIR}/scripts/steps/train_cpt.py"
-RUN_WITH = "cmd"
+RUN_WITH = "argv"
 MEGATRON = "${MEGATRON}"
 DATA_PATH = "${DATAPOOL_ROOT}/data/tokenized/cpt/${MODEL_PREFIX}_text_document"
 SAVE_DIR = "${DATAPOOL_ROOT}/model/cpt_checkpoints"
@@ -25,54 +25,57 @@ BASE_MODEL_PATH = "${BASE_MODEL_PATH}"
 # no-save-optim: 不保存优化器状态，减少checkpoint保存时的显存占用（但无法resume训练）
 # checkpoint格式: 使用legacy格式（--ckpt-format torch），保存为单个.pt文件
 # For quick validation, we use very few steps (2 steps)
-TRAIN_CMD = """torchrun --nproc_per_node=1 --master_port=29500 pretrain_gpt.py \
-  --data-path ${DATA_PATH} \
-  --save ${SAVE_DIR} \
-  --tokenizer-model ${BASE_MODEL_PATH} \
-  --tokenizer-type HuggingFaceTokenizer \
-  --merge-file '' \
-  --num-layers 4 \
-  --hidden-size 512 \
-  --num-attention-heads 8 \
-  --ffn-hidden-size 2048 \
-  --seq-length 256 \
-  --max-position-embeddings 40960 \
-  --vocab-size 151936 \
-  --micro-batch-size 1 \
-  --global-batch-size 1 \
-  --train-iters 2 \
-  --recompute-granularity selective \
-  --lr 6.0e-4 \
-  --min-lr 6.0e-5 \
-  --lr-decay-style cosine \
-  --lr-warmup-iters 1 \
-  --weight-decay 0.1 \
-  --adam-beta1 0.9 \
-  --adam-beta2 0.95 \
-  --adam-eps 1.0e-8 \
-  --clip-grad 1.0 \
-  --log-interval 5 \
-  --save-interval 1000 \
-  --eval-interval 1000 \
-  --eval-iters 0 \
-  --split 100,0,0 \
-  --reset-attention-mask \
-  --reset-position-ids \
-  --tensorboard-dir ${SAVE_DIR}/tensorboard \
-  --ckpt-format torch \
-  --no-save-optim \
-  --bf16 \
-  --use-flash-attn \
-  --attention-backend flash \
-  --no-masked-softmax-fusion \
-  --no-bias-gelu-fusion \
-  --transformer-impl local \
-  --disable-bias-linear \
-  --normalization RMSNorm \
-  --no-persist-layer-norm \
-  --no-gradient-accumulation-fusion \
-  --swiglu \
-  --untie-embeddings-and-output-weights"""
+TRAIN_LAUNCHER = "torchrun --nproc_per_node=1 --master_port=29500"
+TRAIN_ENTRY = "pretrain_gpt.py"
+TRAIN_ARGS = [
+    ("data-path", "${DATA_PATH}"),
+    ("save", "${SAVE_DIR}"),
+    ("tokenizer-model", "${BASE_MODEL_PATH}"),
+    ("tokenizer-type", "HuggingFaceTokenizer"),
+    ("merge-file", ""),
+    ("num-layers", "4"),
+    ("hidden-size", "512"),
+    ("num-attention-heads", "8"),
+    ("ffn-hidden-size", "2048"),
+    ("seq-length", "256"),
+    ("max-position-embeddings", "40960"),
+    ("vocab-size", "151936"),
+    ("micro-batch-size", "1"),
+    ("global-batch-size", "1"),
+    ("train-iters", "2"),
+    ("recompute-granularity", "selective"),
+    ("lr", "6.0e-4"),
+    ("min-lr", "6.0e-5"),
+    ("lr-decay-style", "cosine"),
+    ("lr-warmup-iters", "1"),
+    ("weight-decay", "0.1"),
+    ("adam-beta1", "0.9"),
+    ("adam-beta2", "0.95"),
+    ("adam-eps", "1.0e-8"),
+    ("clip-grad", "1.0"),
+    ("log-interval", "5"),
+    ("save-interval", "1000"),
+    ("eval-interval", "1000"),
+    ("eval-iters", "0"),
+    ("split", "100,0,0"),
+    ("reset-attention-mask", None),
+    ("reset-position-ids", None),
+    ("tensorboard-dir", "${SAVE_DIR}/tensorboard"),
+    ("ckpt-format", "torch"),
+    ("no-save-optim", None),
+    ("bf16", None),
+    ("use-flash-attn", None),
+    ("attention-backend", "flash"),
+    ("no-masked-softmax-fusion", None),
+    ("no-bias-gelu-fusion", None),
+    ("transformer-impl", "local"),
+    ("disable-bias-linear", None),
+    ("normalization", "RMSNorm"),
+    ("no-persist-layer-norm", None),
+    ("no-gradient-accumulation-fusion", None),
+    ("swiglu", None),
+    ("untie-embeddings-and-output-weights", None),
+]
 ENTRYPOINT = "pretrain_gpt.py"
 ARGS = ""
 
@@ -4,7 +4,7 @@
 # 注意：Megatron-LM 默认 --ckpt-format=torch_dist（会产出 .distcp）。
 # 这里显式指定 legacy：--ckpt-format torch（产出单个 .pt）。
 SCRIPT = "python3 ${ROOT_DIR}/scripts/steps/train_sft.py"
-RUN_WITH = "cmd"
+RUN_WITH = "argv"
 MEGATRON = "${MEGATRON}"
 
 # Input / output
@@ -16,55 +16,58 @@ SAVE_DIR = "${DATAPOOL_ROOT}/model/sft_checkpoints"
 BASE_MODEL_PATH = "${BASE_MODEL_PATH}"
 
 # Minimal “run-through” config (single GPU)
-TRAIN_CMD = """torchrun --nproc_per_node=1 --master_port=29501 pretrain_gpt.py \
-  --data-path ${DATA_PATH} \
-  --load ${LOAD_DIR} \
-  --save ${SAVE_DIR} \
-  --ckpt-format torch \
-  --finetune \
-  --tokenizer-model ${BASE_MODEL_PATH} \
-  --tokenizer-type HuggingFaceTokenizer \
-  --merge-file '' \
-  --num-layers 4 \
-  --hidden-size 512 \
-  --num-attention-heads 8 \
-  --ffn-hidden-size 2048 \
-  --seq-length 256 \
-  --max-position-embeddings 40960 \
-  --vocab-size 151936 \
-  --micro-batch-size 1 \
-  --global-batch-size 1 \
-  --train-iters 2 \
-  --split 100,0,0 \
-  --recompute-granularity selective \
-  --lr 6.0e-5 \
-  --min-lr 6.0e-6 \
-  --lr-decay-style cosine \
-  --lr-warmup-iters 1 \
-  --weight-decay 0.1 \
-  --adam-beta1 0.9 \
-  --adam-beta2 0.95 \
-  --adam-eps 1.0e-8 \
-  --clip-grad 1.0 \
-  --log-interval 5 \
-  --save-interval 1000 \
-  --eval-interval 1000 \
-  --eval-iters 0 \
-  --reset-attention-mask \
-  --reset-position-ids \
-  --tensorboard-dir ${SAVE_DIR}/tensorboard \
-  --no-save-optim \
-  --use-flash-attn \
-  --attention-backend flash \
-  --no-masked-softmax-fusion \
-  --no-bias-gelu-fusion \
-  --transformer-impl local \
-  --disable-bias-linear \
-  --normalization RMSNorm \
-  --no-persist-layer-norm \
-  --no-gradient-accumulation-fusion \
-  --swiglu \
-  --untie-embeddings-and-output-weights"""
+TRAIN_LAUNCHER = "torchrun --nproc_per_node=1 --master_port=29501"
+TRAIN_ENTRY = "pretrain_gpt.py"
+TRAIN_ARGS = [
+    ("data-path", "${DATA_PATH}"),
+    ("load", "${LOAD_DIR}"),
+    ("save", "${SAVE_DIR}"),
+    ("ckpt-format", "torch"),
+    ("finetune", None),
+    ("tokenizer-model", "${BASE_MODEL_PATH}"),
+    ("tokenizer-type", "HuggingFaceTokenizer"),
+    ("merge-file", ""),
+    ("num-layers", "4"),
+    ("hidden-size", "512"),
+    ("num-attention-heads", "8"),
+    ("ffn-hidden-size", "2048"),
+    ("seq-length", "256"),
+    ("max-position-embeddings", "40960"),
+    ("vocab-size", "151936"),
+    ("micro-batch-size", "1"),
+    ("global-batch-size", "1"),
+    ("train-iters", "2"),
+    ("split", "100,0,0"),
+    ("recompute-granularity", "selective"),
+    ("lr", "6.0e-5"),
+    ("min-lr", "6.0e-6"),
+    ("lr-decay-style", "cosine"),
+    ("lr-warmup-iters", "1"),
+    ("weight-decay", "0.1"),
+    ("adam-beta1", "0.9"),
+    ("adam-beta2", "0.95"),
+    ("adam-eps", "1.0e-8"),
+    ("clip-grad", "1.0"),
+    ("log-interval", "5"),
+    ("save-interval", "1000"),
+    ("eval-interval", "1000"),
+    ("eval-iters", "0"),
+    ("reset-attention-mask", None),
+    ("reset-position-ids", None),
+    ("tensorboard-dir", "${SAVE_DIR}/tensorboard"),
+    ("no-save-optim", None),
+    ("use-flash-attn", None),
+    ("attention-backend", "flash"),
+    ("no-masked-softmax-fusion", None),
+    ("no-bias-gelu-fusion", None),
+    ("transformer-impl", "local"),
+    ("disable-bias-linear", None),
+    ("normalization", "RMSNorm"),
+    ("no-persist-layer-norm", None),
+    ("no-gradient-accumulation-fusion", None),
+    ("swiglu", None),
+    ("untie-embeddings-and-output-weights", None),
+]
 
   # --position-embedding-type rope \
   # --rotary-base 1000000 \
@@ -20,6 +20,8 @@ STEPS = [
 # 复制后，safetensors 文件直接在 ${DATAPOOL_ROOT}/model/base/${BASE_MODEL_NAME} 目录下
 BASE_MODEL_NAME = "Qwen3-4B"
 BASE_MODEL_SRC = "/home/unlimitediw/workspace/models/Qwen3-4B"
+# BASE_MODEL_MODE: copy（默认，reflink 不支持时内核拷贝，文件相互独立）| hardlink（与源共享 inode，修改会互相影响）| symlink（整个目录软链到源）
+BASE_MODEL_MODE = "copy"
 # BASE_MODEL_PATH: 实际模型在 datapool 中的路径（prepare_exp 后，供 steps 使用）
 # 这个路径直接指向包含 safetensors、config.json、tokenizer.json 等的目录
 # (defined in configs/common/pipeline_base.py)
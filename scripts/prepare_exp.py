@@ -2,113 +2,181 @@
 from __future__ import annotations
 
 import argparse
+import hashlib
+import json
+import logging
 import os
+import queue
 import shutil
 import sys
-import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, Iterable, List, Tuple
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+try:
+    import fcntl
+except ImportError:  # non-POSIX
+    fcntl = None
 
 ROOT_DIR = Path(__file__).resolve().parent.parent
 UTILS_DIR = ROOT_DIR / "scripts" / "utils"
+# linux/fs.h: _IOW(0x94, 9, int)
+FICLONE = 0x40049409
+# Max (src, dst) pairs buffered between the raw-copy walker and link workers
+COPY_QUEUE_SIZE = 4096
+# Per-dst_dir record of raw jsonl copies (flat_name -> [src, mtime_ns, size])
+COPY_MANIFEST_NAME = ".copied.json"
+# BASE_MODEL_MODE: copy = reflink when supported, else in-kernel copy (independent files);
+# hardlink = share inodes with BASE_MODEL_SRC; symlink = link the whole dir
+BASE_MODEL_MODES = ("copy", "hardlink", "symlink")
+# Per-datapool record of the last completed prepare (key, inputs, trees, targets)
+PREPARE_STAMP_NAME = ".prepare_exp.json"
+
+# Progress log: "[%F %T] msg" on stdout like the rest of the runner.
+# PREPARE_EXP_LOG=WARN silences the per-step info lines.
+log = logging.getLogger("llmrunner.prepare_exp")
+if not log.handlers:
+    _handler = logging.StreamHandler(sys.stdout)
+    _handler.setFormatter(logging.Formatter("[%(asctime)s] %(message)s", datefmt="%F %T"))
+    log.addHandler(_handler)
+    log.propagate = False
+_level = logging.getLevelName(os.environ.get("PREPARE_EXP_LOG", "INFO").strip().upper())
+log.setLevel(_level if isinstance(_level, int) else logging.INFO)
 
 # Load config utils without importing pipeline config modules.
 import importlib.util
 
-_spec = importlib.util.spec_from_file_location("config_utils", UTILS_DIR / "config.py")
-if _spec is None or _spec.loader is None:
-    raise SystemExit(f"Could not load config utils from {UTILS_DIR / 'config.py'}")
-config_utils = importlib.util.module_from_spec(_spec)
-_spec.loader.exec_module(config_utils)
 
-_tu_spec = importlib.util.spec_from_file_location("tokenize_utils", UTILS_DIR / "tokenize_utils.py")
-if _tu_spec is None or _tu_spec.loader is None:
-    raise SystemExit(f"Could not load tokenize utils from {UTILS_DIR / 'tokenize_utils.py'}")
-tokenize_utils = importlib.util.module_from_spec(_tu_spec)
-_tu_spec.loader.exec_module(tokenize_utils)
+@lru_cache(maxsize=None)
+def _load_utils_module(name: str, module_name: str, lazy: bool = False):
+    """
+    Load scripts/utils/<name>.py once per process. Reuses utils.<name> when
+    run.py already imported it, so both share module state (e.g. the
+    load_config_module file cache).
+
+    lazy=True defers executing the module until its first attribute access.
+    """
+    existing = sys.modules.get(f"utils.{name}")
+    if existing is not None:
+        return existing
+    path = UTILS_DIR / f"{name}.py"
+    spec = importlib.util.spec_from_file_location(module_name, path)
+    if spec is None or spec.loader is None:
+        raise SystemExit(f"Could not load {name} utils from {path}")
+    if lazy:
+        spec.loader = importlib.util.LazyLoader(spec.loader)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+# Both execute on first attribute access, so --help / argument errors load neither;
+# tokenize_utils (multiprocessing, ...) is only needed for the raw jsonl merges.
+config_utils = _load_utils_module("config", "config_utils", lazy=True)
+tokenize_utils = _load_utils_module("tokenize_utils", "tokenize_utils", lazy=True)
+
+
+DATAPOOL_LAYOUT = (
+    "data/raw",
+    "data/tokenized",
+    "model/base",
+    "model/cpt_checkpoints",
+    "model/hf",
+    "model/sft_checkpoints",
+    "reports",
+)
+
+
+def _makedirs_fast(path: str) -> None:
+    """mkdir first (one syscall when the parent exists); makedirs only for missing parents."""
+    try:
+        os.mkdir(path)
+    except FileExistsError:
+        if not os.path.isdir(path):
+            raise
+    except FileNotFoundError:
+        os.makedirs(path, exist_ok=True)
 
 
 def ensure_datapool_structure(datapool_root: Path) -> None:
-    for p in [
-        datapool_root / "data" / "raw",
-        datapool_root / "data" / "tokenized",
-        datapool_root / "model" / "cpt_checkpoints",
-        datapool_root / "model" / "sft_checkpoints",
-        datapool_root / "model" / "hf",
-        datapool_root / "model" / "base",
-        datapool_root / "reports",
-    ]:
-        p.mkdir(parents=True, exist_ok=True)
+    # Leaves only: parents (data/, model/) are created along the way.
+    root = str(datapool_root)
+    for rel in DATAPOOL_LAYOUT:
+        _makedirs_fast(os.path.join(root, rel))
     return None
 
 
 def _resolve_path(path_str: str, root_dir: Path) -> Path:
+    # Lexical absolute path (no realpath): symlinks in datapool/source paths are
+    # kept as-is, which is all callers need and avoids a lookup per component.
     path = Path(path_str).expanduser()
     if path.is_absolute():
-        return path.resolve()
-    return (root_dir / path).resolve()
+        return Path(os.path.abspath(path))
+    return Path(os.path.abspath(root_dir / path))
 
 
-def _load_step_config(path: Path, *, root_dir: Path, datapool_root: Path) -> Dict[str, str]:
+def _step_context(*, root_dir: Path, datapool_root: Path) -> Dict[str, str]:
+    """${VAR} context shared by every step config in one prepare run."""
+    context = {
+        "DATAPOOL_ROOT": str(datapool_root),
+        "ROOT_DIR": str(root_dir),
+    }
+    config_utils.apply_env_imports(context, os.environ)
+    return context
+
+
+def _load_step_config(path: Path, *, context: Dict[str, str]) -> Dict[str, str]:
     if not path.exists():
         return {}
     if path.suffix != ".py":
         raise SystemExit("Only .py pipeline configs are supported")
     config = config_utils.load_config_module(path)
     config_utils.merge_env_defaults(config, os.environ)
-    context = {
-        "DATAPOOL_ROOT": str(datapool_root),
-        "ROOT_DIR": str(root_dir),
-    }
-    config_utils.apply_env_imports(context, os.environ)
     return config_utils.resolve_config_vars(config, context)
 
 
-def _iter_tokenize_step_configs(steps_dir: Path, step_type: str) -> List[Path]:
+def _iter_tokenize_step_configs(step_config_paths: List[Path], step_type: str) -> List[Path]:
     """
-    Return all tokenize step config files for a step type.
+    Return all tokenize step config files for a step type, picked from the
+    steps/ listing (see _iter_all_step_configs).
     Only instance-style naming is supported: <step_type>_<idx>.py
     Examples: tokenize_cpt_0.py, tokenize_sft_1.py
     """
-    if not steps_dir.exists():
-        return []
-
     indexed_prefix = f"{step_type}_"
-    matched: List[Path] = []
-
-    for p in steps_dir.glob(f"{step_type}_*.py"):
-        stem = p.stem
+    matched: List[Tuple[int, str, Path]] = []
+    for p in step_config_paths:
+        stem = p.name[: -len(".py")]
         tail = stem[len(indexed_prefix):] if stem.startswith(indexed_prefix) else ""
         if tail.isdigit():
-            matched.append(p)
-
-    def sort_key(path: Path) -> tuple[int, str]:
-        stem = path.stem
-        tail = stem[len(indexed_prefix):]
-        return (int(tail), stem)
-
-    # Deduplicate while preserving deterministic order
-    unique = {p.resolve(): p for p in matched}
-    return sorted(unique.values(), key=sort_key)
+            matched.append((int(tail), stem, p))
+    matched.sort(key=lambda x: (x[0], x[1]))
+    return [p for _, _, p in matched]
 
 
 def _iter_all_step_configs(steps_dir: Path) -> List[Path]:
-    if not steps_dir.exists():
+    """All *.py files directly under steps/ (one os.scandir, no per-file stat), sorted by name."""
+    try:
+        with os.scandir(steps_dir) as it:
+            names = sorted(e.name for e in it if e.name.endswith(".py") and e.is_file())
+    except FileNotFoundError:
         return []
-    return sorted([p for p in steps_dir.glob("*.py") if p.is_file()], key=lambda p: p.name)
+    return [steps_dir / name for name in names]
+
+
+DATA_PATH_SUFFIXES = ("DATA_PATH", "MODEL_PATH")
 
 
-def _ensure_data_path_dirs_from_config(
+def _data_path_dirs_from_config(
     config: Dict[str, str],
     *,
     root_dir: Path,
-    source_config_name: str,
-) -> None:
+) -> List[Tuple[str, str]]:
+    """(key, dir) for the directory behind every *_DATA_PATH/*_MODEL_PATH value (nothing is created)."""
+    ensured: List[Tuple[str, str]] = []
     for key, value in config.items():
-        if not (
-            isinstance(key, str)
-            and (key.endswith("DATA_PATH") or key.endswith("MODEL_PATH"))
-        ):
+        if type(key) is not str or not key.endswith(DATA_PATH_SUFFIXES):
             continue
         if not isinstance(value, str):
             continue
@@ -127,11 +195,201 @@ def _ensure_data_path_dirs_from_config(
             # Most non-input DATA_PATH values are file/prefix style; ensure parent exists.
             target_dir = resolved.parent
 
-        target_dir.mkdir(parents=True, exist_ok=True)
-        print(
-            f"[{time.strftime('%F %T')}] ensure_dir[{source_config_name}]: "
-            f"{key} -> {target_dir}"
+        ensured.append((key, str(target_dir)))
+    return ensured
+
+
+def _process_step_config(
+    path: Path,
+    *,
+    context: Dict[str, str],
+    root_dir: Path,
+) -> Tuple[Dict[str, str], List[Tuple[str, str]], Dict[str, List[int] | None]]:
+    """Load + resolve one step config. Returns (config, data dirs, file deps)."""
+    config = _load_step_config(path, context=context)
+    ensured = _data_path_dirs_from_config(config, root_dir=root_dir)
+    deps = {str(dep): _stat_key(str(dep)) for dep in config_utils.config_file_deps(path)}
+    return config, ensured, deps
+
+
+def _report_clashes(clashes: List[str], limit: int = 20) -> None:
+    """Print up to limit skipped (already existing) files to stderr in one write."""
+    if not clashes:
+        return
+    lines = ["  [warn] skip (exists): %s\n" % x for x in clashes[:limit]]
+    if len(clashes) > limit:
+        lines.append("  ... and %d more\n" % (len(clashes) - limit))
+    sys.stderr.write("".join(lines))
+    sys.stderr.flush()
+
+
+def _stat_key(path: str) -> List[int] | None:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
+
+def _jsonl_tree_key(root: str) -> List[List]:
+    """Sorted [relpath, mtime_ns, size] of every *.jsonl under root (the raw copy source set)."""
+    prefix_len = len(os.path.join(root, ""))
+    records = []
+    for path in _scandir_jsonl(root):
+        stat_key = _stat_key(path)
+        if stat_key is not None:
+            records.append([path[prefix_len:], *stat_key])
+    records.sort()
+    return records
+
+
+def _prepare_key(pipeline_env: Dict[str, str], step_config_paths: List[Path]) -> str:
+    """Hash of everything prepare reads that is known before loading step configs."""
+    payload = {
+        "pipeline_env": {k: str(v) for k, v in pipeline_env.items()},
+        "environ": {k: os.environ.get(k) for k in config_utils.ENV_IMPORT_KEYS},
+        "steps": {str(p): _stat_key(str(p)) for p in step_config_paths},
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _prepare_up_to_date(stamp_path: Path, key: str) -> bool:
+    """
+    True when the stamp from the last completed prepare has the same key,
+    its recorded inputs (INCLUDEd configs, base model source dir) and raw
+    copy sources (every *.jsonl, recursively) are unchanged and all of its
+    targets still exist.
+    """
+    try:
+        with open(stamp_path, "r", encoding="utf-8") as f:
+            stamp = json.load(f)
+    except (OSError, ValueError):
+        return False
+    if not isinstance(stamp, dict) or stamp.get("key") != key:
+        return False
+    for path, stat_key in stamp.get("inputs", {}).items():
+        if _stat_key(path) != stat_key:
+            return False
+    for root, tree_key in stamp.get("trees", {}).items():
+        if _jsonl_tree_key(root) != tree_key:
+            return False
+    return all(os.path.exists(p) for p in stamp.get("targets", []))
+
+
+def _write_prepare_stamp(
+    stamp_path: Path,
+    key: str,
+    inputs: Dict[str, List[int] | None],
+    trees: Dict[str, List[List]],
+    targets: List[str],
+) -> None:
+    tmp = stamp_path.with_name(stamp_path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(
+            {"key": key, "inputs": inputs, "trees": trees, "targets": sorted(set(targets))},
+            f,
+            ensure_ascii=False,
+        )
+    os.replace(tmp, stamp_path)
+
+
+# kind -> (INPUT_DATA_PATH fallback keys, JSON_KEYS fallback keys, default JSON_KEYS)
+RAW_DATA_KEYS = {
+    "cpt": (("INPUT_DATA_PATH",), ("JSON_KEYS",), "text"),
+    "sft": (("INPUT_DATA_PATH", "SFT_INPUT_DATA_PATH"), ("JSON_KEYS", "SFT_JSON_KEYS"), "instruction input output"),
+}
+
+
+def _first_config_value(config: Dict[str, str], keys: Tuple[str, ...], default: str = ""):
+    for key in keys:
+        value = config.get(key)
+        if value:
+            return value
+    return default
+
+
+def _prepare_raw_data(
+    kind: str,
+    config_paths: List[Path],
+    step_configs: Dict[Path, Dict[str, str]],
+    *,
+    datapool_root: Path,
+    root_dir: Path,
+) -> Tuple[Dict[str, List[List]], List[str]]:
+    """
+    Copy <KIND>_RAW_COPY_SRC into data/raw/<kind> and merge INPUT_DATA_PATH into
+    merged_input.jsonl for every tokenize_<kind> config. Returns the (trees,
+    targets) to record in the prepare stamp.
+    """
+    label = kind.upper()
+    input_keys, json_keys_keys, default_json_keys = RAW_DATA_KEYS[kind]
+    trees: Dict[str, List[List]] = {}
+    targets: List[str] = []
+    if not config_paths:
+        log.info("%s_RAW_COPY_SRC: skipped (tokenize_%s config not found)", label, kind)
+    for config_path in config_paths:
+        config = step_configs[config_path]
+        copy_src = config.get(f"{label}_RAW_COPY_SRC", "").strip()
+        if copy_src:
+            src_dir = _resolve_path(copy_src, root_dir)
+            if not src_dir.exists():
+                raise SystemExit(f"{label}_RAW_COPY_SRC not found: {src_dir}")
+            dst_dir = datapool_root / "data" / "raw" / kind
+            log.info("%s_RAW_COPY_SRC[%s]: %s -> %s (mode=copy)", label, config_path.name, src_dir, dst_dir)
+            # Per-file stats taken before copying, so a file changed mid-copy re-triggers next time
+            trees[str(src_dir)] = _jsonl_tree_key(str(src_dir))
+            copied, clashes = copy_jsonl_flat(src_dir, dst_dir)
+            targets.append(str(dst_dir))
+            log.info("%s_RAW_COPY_SRC[%s]: copied_jsonl=%s clashes=%s", label, config_path.name, copied, len(clashes))
+            _report_clashes(clashes)
+        else:
+            log.info("%s_RAW_COPY_SRC: skipped (not set in %s)", label, config_path.name)
+
+        merge_jsonl = str(config.get("MERGE_JSONL", "1")) == "1"
+        if not merge_jsonl:
+            continue
+        input_path = str(_first_config_value(config, input_keys)).strip()
+        json_keys = _first_config_value(config, json_keys_keys, default_json_keys)
+        shuffle_jsonl = str(config.get("SHUFFLE_JSONL", "0")) == "1"
+        shuffle_seed = config.get("SHUFFLE_SEED")
+        shuffle_buffer = int(config.get("SHUFFLE_BUFFER", "10000"))
+        shuffle_mode = str(config.get("SHUFFLE_MODE", "block")).strip().lower()
+        merge_workers = int(config.get("WORKERS", "16"))
+        if not input_path:
+            log.info("%s merge_jsonl: skipped (missing INPUT_DATA_PATH in %s)", label, config_path.name)
+            continue
+        input_abs = _resolve_path(input_path, root_dir)
+        # Write merged input under raw/<kind> so it is not cleared when tokenized/<kind> is cleared
+        merge_output = (input_abs / "merged_input.jsonl") if input_abs.is_dir() else (input_abs.parent / "merged_input.jsonl")
+        if isinstance(json_keys, str):
+            required_keys = json_keys.split()
+        else:
+            required_keys = json_keys if isinstance(json_keys, list) else None
+        targets.append(str(merge_output))
+        exclude: List[Path] = []
+        if kind == "sft" and str(config.get("REWRITE_INPUT_LABEL", "0")) == "1":
+            rewrite_output = str(config.get("REWRITE_OUTPUT_FILE", "")).strip()
+            exclude.append(
+                _resolve_path(rewrite_output, root_dir)
+                if rewrite_output
+                else merge_output.parent / tokenize_utils.SFT_REWRITE_OUTPUT_NAME
+            )
+        # Skipped inside when merged_input.jsonl.sources.json matches the current inputs
+        tokenize_utils.expand_input_pattern(
+            input_path,
+            root_dir,
+            merge_files=True,
+            merge_output=merge_output,
+            required_json_keys=required_keys,
+            shuffle=shuffle_jsonl,
+            shuffle_seed=int(shuffle_seed) if shuffle_seed else None,
+            shuffle_buffer=shuffle_buffer,
+            shuffle_mode=shuffle_mode,
+            workers=merge_workers,
+            exclude=exclude,
         )
+        log.info("%s merge_jsonl[%s]: output=%s shuffle=%s", label, config_path.name, merge_output, shuffle_jsonl)
+    return trees, targets
 
 
 def prepare_from_env(
@@ -143,206 +401,418 @@ def prepare_from_env(
     dp = pipeline_env.get("DATAPOOL_ROOT") or "datapool"
     datapool_root = _resolve_path(dp, root_dir)
     # Prepare (copy raw, merge jsonl) always runs; DRY_RUN only affects steps in run.py
+    steps_dir = config_dir / "steps"
+    all_step_config_paths = _iter_all_step_configs(steps_dir)
+
+    # Fast path: nothing changed since the last completed prepare and all of its
+    # outputs are still there. Remove <datapool>/.prepare_exp.json to force a rerun.
+    stamp_path = datapool_root / PREPARE_STAMP_NAME
+    prepare_key = _prepare_key(pipeline_env, all_step_config_paths)
+    if _prepare_up_to_date(stamp_path, prepare_key):
+        log.info("prepare_exp: up-to-date, skipping (stamp=%s)", stamp_path)
+        return
+    inputs: Dict[str, List[int] | None] = {}
+    targets: List[str] = []
 
     ensure_datapool_structure(datapool_root)
-    print(f"[{time.strftime('%F %T')}] config_dir={config_dir}")
-    print(f"[{time.strftime('%F %T')}] datapool_root={datapool_root}")
+    log.info("config_dir=%s", config_dir)
+    log.info("datapool_root=%s", datapool_root)
 
     # Copy/link base model
     base_model_src = pipeline_env.get("BASE_MODEL_SRC", "").strip()
     base_model_name = pipeline_env.get("BASE_MODEL_NAME", "base_model").strip() or "base_model"
+    base_model_mode = pipeline_env.get("BASE_MODEL_MODE", "copy").strip().lower() or "copy"
+    if base_model_mode not in BASE_MODEL_MODES:
+        raise SystemExit(f"Invalid BASE_MODEL_MODE: {base_model_mode!r}. Use one of: {', '.join(BASE_MODEL_MODES)}")
     if base_model_src:
         src = _resolve_path(base_model_src, root_dir)
         dst = datapool_root / "model" / "base" / base_model_name
-        print(f"[{time.strftime('%F %T')}] base_model: {src} -> {dst} (mode=copy)")
+        log.info("base_model: %s -> %s (mode=%s)", src, dst, base_model_mode)
         if not src.exists():
             raise SystemExit(f"BASE_MODEL_SRC not found: {src}")
-        if dst.exists():
-            print(f"[{time.strftime('%F %T')}] base_model: exists, skip -> {dst}")
+        inputs[str(src)] = _stat_key(str(src))
+        targets.append(str(dst))
+        if os.path.lexists(dst):
+            log.info("base_model: exists, skip -> %s", dst)
+        elif base_model_mode == "symlink":
+            tmp_link = dst.with_name(dst.name + ".partial")
+            if os.path.lexists(tmp_link):
+                os.unlink(tmp_link)
+            os.symlink(src, tmp_link, target_is_directory=True)
+            os.replace(tmp_link, dst)
+            log.info("base_model: symlinked -> %s", dst)
         else:
-            shutil.copytree(src, dst)
+            # Copy into a sibling .partial dir and rename, so an interrupted copy
+            # is not mistaken for a complete base model on the next run.
+            partial = dst.with_name(dst.name + ".partial")
+            shutil.rmtree(partial, ignore_errors=True)
+            copy_function = _hardlink_or_copy if base_model_mode == "hardlink" else _reflink_or_copy
+            n_files = _copytree_parallel(src, partial, copy_function=copy_function)
+            os.replace(partial, dst)
+            log.info("base_model: copied %s files -> %s", n_files, dst)
     else:
-        print(f"[{time.strftime('%F %T')}] base_model: skipped (BASE_MODEL_SRC not set)")
+        log.info("base_model: skipped (BASE_MODEL_SRC not set)")
 
     # Optional: copy CPT/SFT raw data from all tokenize configs under steps/
-    steps_dir = config_dir / "steps"
-    cpt_config_paths = _iter_tokenize_step_configs(steps_dir, "tokenize_cpt")
-    sft_config_paths = _iter_tokenize_step_configs(steps_dir, "tokenize_sft")
-    all_step_config_paths = _iter_all_step_configs(steps_dir)
+    cpt_config_paths = _iter_tokenize_step_configs(all_step_config_paths, "tokenize_cpt")
+    sft_config_paths = _iter_tokenize_step_configs(all_step_config_paths, "tokenize_sft")
+
+    # Resolve every step config once (the tokenize loops below reuse these) on a
+    # thread pool: configs are independent. Log lines are emitted afterwards in
+    # config order.
+    context = _step_context(root_dir=root_dir, datapool_root=datapool_root)
+    step_configs: Dict[Path, Dict[str, str]] = {}
+    data_dirs: Dict[str, None] = {}
+    if all_step_config_paths:
+        with ThreadPoolExecutor(max_workers=min(32, len(all_step_config_paths))) as ex:
+            processed = list(ex.map(
+                lambda p: _process_step_config(p, context=context, root_dir=root_dir),
+                all_step_config_paths,
+            ))
+        for step_config_path, (step_config, ensured, deps) in zip(all_step_config_paths, processed):
+            step_configs[step_config_path] = step_config
+            for key, target_dir in ensured:
+                log.info("ensure_dir[%s]: %s -> %s", step_config_path.name, key, target_dir)
+                data_dirs[target_dir] = None
+            inputs.update(deps)
+
+    # Ensure directories for all *_DATA_PATH config vars across all steps: steps share
+    # most of them, so create each unique dir once, ancestors first.
+    for target_dir in sorted(data_dirs, key=lambda d: d.count(os.sep)):
+        _makedirs_fast(target_dir)
+    targets.extend(data_dirs)
+
+    # CPT and SFT raw data live in different source and raw/ dirs: prepare both kinds
+    # concurrently (configs of one kind share a raw dir, so they stay serial).
+    trees: Dict[str, List[List]] = {}
+    if cpt_config_paths or sft_config_paths:
+        # Materialize the lazy module here: LazyLoader is not thread-safe before 3.12
+        tokenize_utils.expand_input_pattern
+    with ThreadPoolExecutor(max_workers=2) as ex:
+        futures = [
+            ex.submit(
+                _prepare_raw_data,
+                kind,
+                config_paths,
+                step_configs,
+                datapool_root=datapool_root,
+                root_dir=root_dir,
+            )
+            for kind, config_paths in (("cpt", cpt_config_paths), ("sft", sft_config_paths))
+        ]
+        for future in futures:
+            kind_trees, kind_targets = future.result()
+            trees.update(kind_trees)
+            targets.extend(kind_targets)
 
-    # Ensure directories for all *_DATA_PATH config vars across all steps.
-    for step_config_path in all_step_config_paths:
-        step_config = _load_step_config(step_config_path, root_dir=root_dir, datapool_root=datapool_root)
-        _ensure_data_path_dirs_from_config(
-            step_config,
-            root_dir=root_dir,
-            source_config_name=step_config_path.name,
-        )
+    _write_prepare_stamp(stamp_path, prepare_key, inputs, trees, targets)
+    log.info("prepare_exp done")
 
-    if not cpt_config_paths:
-        print(f"[{time.strftime('%F %T')}] CPT_RAW_COPY_SRC: skipped (tokenize_cpt config not found)")
-    for cpt_config_path in cpt_config_paths:
-        cpt_config = _load_step_config(cpt_config_path, root_dir=root_dir, datapool_root=datapool_root)
-        copy_src = cpt_config.get("CPT_RAW_COPY_SRC", "").strip()
-        if copy_src:
-            src_dir = _resolve_path(copy_src, root_dir)
-            if not src_dir.exists():
-                raise SystemExit(f"CPT_RAW_COPY_SRC not found: {src_dir}")
-            dst_dir = datapool_root / "data" / "raw" / "cpt"
-            print(
-                f"[{time.strftime('%F %T')}] CPT_RAW_COPY_SRC[{cpt_config_path.name}]: "
-                f"{src_dir} -> {dst_dir} (mode=copy)"
-            )
-            copied, clashes = copy_jsonl_flat(src_dir, dst_dir)
-            print(
-                f"[{time.strftime('%F %T')}] CPT_RAW_COPY_SRC[{cpt_config_path.name}]: "
-                f"copied_jsonl={copied} clashes={len(clashes)}"
-            )
-            if clashes:
-                for x in clashes[:20]:
-                    print(f"  [warn] skip (exists): {x}", file=sys.stderr)
-                if len(clashes) > 20:
-                    print(f"  ... and {len(clashes) - 20} more", file=sys.stderr)
-        else:
-            print(f"[{time.strftime('%F %T')}] CPT_RAW_COPY_SRC: skipped (not set in {cpt_config_path.name})")
-
-        merge_jsonl = str(cpt_config.get("MERGE_JSONL", "1")) == "1"
-        if merge_jsonl:
-            input_path = cpt_config.get("INPUT_DATA_PATH", "").strip()
-            json_keys = cpt_config.get("JSON_KEYS", "text")
-            shuffle_jsonl = str(cpt_config.get("SHUFFLE_JSONL", "0")) == "1"
-            shuffle_seed = cpt_config.get("SHUFFLE_SEED")
-            shuffle_buffer = int(cpt_config.get("SHUFFLE_BUFFER", "10000"))
-            if input_path:
-                input_abs = _resolve_path(input_path, root_dir)
-                # Write merged input under raw/cpt so it is not cleared when tokenized/cpt is cleared
-                merge_output = (input_abs / "merged_input.jsonl") if input_abs.is_dir() else (input_abs.parent / "merged_input.jsonl")
-                if isinstance(json_keys, str):
-                    required_keys = json_keys.split()
-                else:
-                    required_keys = json_keys if isinstance(json_keys, list) else None
-                if merge_output.exists():
-                    print(
-                        f"[{time.strftime('%F %T')}] CPT merge_jsonl[{cpt_config_path.name}]: "
-                        f"skipped (exists) output={merge_output}"
-                    )
-                else:
-                    tokenize_utils.expand_input_pattern(
-                        input_path,
-                        root_dir,
-                        merge_files=True,
-                        merge_output=merge_output,
-                        required_json_keys=required_keys,
-                        shuffle=shuffle_jsonl,
-                        shuffle_seed=int(shuffle_seed) if shuffle_seed else None,
-                        shuffle_buffer=shuffle_buffer,
-                    )
-                    print(
-                        f"[{time.strftime('%F %T')}] CPT merge_jsonl[{cpt_config_path.name}]: "
-                        f"output={merge_output} shuffle={shuffle_jsonl}"
-                    )
-            else:
-                print(f"[{time.strftime('%F %T')}] CPT merge_jsonl: skipped (missing INPUT_DATA_PATH in {cpt_config_path.name})")
 
-    if not sft_config_paths:
-        print(f"[{time.strftime('%F %T')}] SFT_RAW_COPY_SRC: skipped (tokenize_sft config not found)")
-    for sft_config_path in sft_config_paths:
-        sft_config = _load_step_config(sft_config_path, root_dir=root_dir, datapool_root=datapool_root)
-        copy_src = sft_config.get("SFT_RAW_COPY_SRC", "").strip()
-        if copy_src:
-            src_dir = _resolve_path(copy_src, root_dir)
-            if not src_dir.exists():
-                raise SystemExit(f"SFT_RAW_COPY_SRC not found: {src_dir}")
-            dst_dir = datapool_root / "data" / "raw" / "sft"
-            print(
-                f"[{time.strftime('%F %T')}] SFT_RAW_COPY_SRC[{sft_config_path.name}]: "
-                f"{src_dir} -> {dst_dir} (mode=copy)"
-            )
-            copied, clashes = copy_jsonl_flat(src_dir, dst_dir)
-            print(
-                f"[{time.strftime('%F %T')}] SFT_RAW_COPY_SRC[{sft_config_path.name}]: "
-                f"copied_jsonl={copied} clashes={len(clashes)}"
-            )
-            if clashes:
-                for x in clashes[:20]:
-                    print(f"  [warn] skip (exists): {x}", file=sys.stderr)
-                if len(clashes) > 20:
-                    print(f"  ... and {len(clashes) - 20} more", file=sys.stderr)
-        else:
-            print(f"[{time.strftime('%F %T')}] SFT_RAW_COPY_SRC: skipped (not set in {sft_config_path.name})")
-
-        merge_jsonl = str(sft_config.get("MERGE_JSONL", "1")) == "1"
-        if merge_jsonl:
-            input_path = sft_config.get("INPUT_DATA_PATH") or sft_config.get("SFT_INPUT_DATA_PATH", "")
-            json_keys = sft_config.get("JSON_KEYS") or sft_config.get("SFT_JSON_KEYS", "instruction input output")
-            shuffle_jsonl = str(sft_config.get("SHUFFLE_JSONL", "0")) == "1"
-            shuffle_seed = sft_config.get("SHUFFLE_SEED")
-            shuffle_buffer = int(sft_config.get("SHUFFLE_BUFFER", "10000"))
-            if input_path:
-                input_abs = _resolve_path(input_path, root_dir)
-                # Write merged input under raw/sft so it is not cleared when tokenized/sft is cleared
-                merge_output = (input_abs / "merged_input.jsonl") if input_abs.is_dir() else (input_abs.parent / "merged_input.jsonl")
-                if isinstance(json_keys, str):
-                    required_keys = json_keys.split()
-                else:
-                    required_keys = json_keys if isinstance(json_keys, list) else None
-                if merge_output.exists():
-                    print(
-                        f"[{time.strftime('%F %T')}] SFT merge_jsonl[{sft_config_path.name}]: "
-                        f"skipped (exists) output={merge_output}"
-                    )
-                else:
-                    tokenize_utils.expand_input_pattern(
-                        input_path,
-                        root_dir,
-                        merge_files=True,
-                        merge_output=merge_output,
-                        required_json_keys=required_keys,
-                        shuffle=shuffle_jsonl,
-                        shuffle_seed=int(shuffle_seed) if shuffle_seed else None,
-                        shuffle_buffer=shuffle_buffer,
-                    )
-                    print(
-                        f"[{time.strftime('%F %T')}] SFT merge_jsonl[{sft_config_path.name}]: "
-                        f"output={merge_output} shuffle={shuffle_jsonl}"
-                    )
-            else:
-                print(f"[{time.strftime('%F %T')}] SFT merge_jsonl: skipped (missing INPUT_DATA_PATH in {sft_config_path.name})")
+def _scandir_jsonl(root: str) -> Iterator[str]:
+    """
+    Yield paths of *.jsonl files under root with an explicit os.scandir stack.
+    DirEntry caches the d_type from readdir, so non-symlink entries cost no
+    extra stat. Like Path.rglob, symlinked files are followed but symlinked
+    directories are not descended into.
+    """
+    stack = [root]
+    while stack:
+        current = stack.pop()
+        try:
+            it = os.scandir(current)
+        except OSError:
+            continue
+        subdirs: List[str] = []
+        with it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                elif entry.name.endswith(".jsonl") and entry.is_file():
+                    yield entry.path
+        # Reverse so directories are visited in scandir order.
+        stack.extend(reversed(subdirs))
+
 
-    print(f"[{time.strftime('%F %T')}] prepare_exp done")
+def iter_jsonl_files_recursive(src_dir: Path) -> Iterable[Path]:
+    for path in _scandir_jsonl(str(src_dir)):
+        yield Path(path)
 
 
-def _copy_or_link_file(src: str, dst: str) -> None:
+def _reflink(src: str, dst: str, *, src_dir_fd: int | None = None, dst_dir_fd: int | None = None) -> bool:
+    """
+    Clone src to a new file dst with FICLONE (copy-on-write on Btrfs/XFS):
+    no data blocks move and later edits to either side do not leak into the
+    other. Returns False (leaving no dst behind) when unsupported, e.g.
+    cross-device or ext4. Raises FileExistsError if dst exists.
+    src/dst are relative to src_dir_fd/dst_dir_fd when given (like os.link).
     """
-    Try hardlink first (fast, saves space). If cross-device, fallback to copy2.
+    if fcntl is None:
+        return False
+    src_fd = os.open(src, os.O_RDONLY, dir_fd=src_dir_fd)
+    try:
+        dst_fd = os.open(dst, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644, dir_fd=dst_dir_fd)
+        try:
+            fcntl.ioctl(dst_fd, FICLONE, src_fd)
+            if src_dir_fd is not None or dst_dir_fd is not None:
+                # No usable paths for copystat: copy mode and times through the fds
+                st = os.fstat(src_fd)
+                os.fchmod(dst_fd, st.st_mode & 0o7777)
+                os.utime(dst_fd, ns=(st.st_atime_ns, st.st_mtime_ns))
+        except OSError:
+            os.close(dst_fd)
+            os.unlink(dst, dir_fd=dst_dir_fd)
+            return False
+        os.close(dst_fd)
+    finally:
+        os.close(src_fd)
+    if src_dir_fd is None and dst_dir_fd is None:
+        shutil.copystat(src, dst)
+    return True
+
+
+def _kernel_copy(src: str, dst: str) -> str:
+    """
+    Copy with os.copy_file_range (in-kernel; server-side on NFS, reflink on
+    some filesystems) and copy metadata like copy2. Falls back to copy2 when
+    the kernel or filesystem pair does not support it.
     """
+    if not hasattr(os, "copy_file_range"):
+        return shutil.copy2(src, dst)
+    try:
+        with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+            remaining = os.fstat(fsrc.fileno()).st_size
+            while remaining > 0:
+                n = os.copy_file_range(fsrc.fileno(), fdst.fileno(), remaining)
+                if n == 0:
+                    break
+                remaining -= n
+    except OSError:
+        return shutil.copy2(src, dst)
+    shutil.copystat(src, dst)
+    return dst
+
+
+def _reflink_or_copy(src: str, dst: str) -> str:
+    """copy_function for shutil.copytree: reflink when possible, else kernel copy."""
+    try:
+        if _reflink(src, dst):
+            return dst
+    except FileExistsError:
+        pass
+    return _kernel_copy(src, dst)
+
+
+def _hardlink_or_copy(src: str, dst: str) -> str:
+    """copy_function for BASE_MODEL_MODE=hardlink: share the inode, copy across devices."""
     try:
         os.link(src, dst)
+        return dst
+    except FileExistsError:
+        raise
     except OSError:
-        shutil.copy2(src, dst)
+        return _reflink_or_copy(src, dst)
 
 
-def iter_jsonl_files_recursive(src_dir: Path) -> Iterable[Path]:
-    for p in src_dir.rglob("*.jsonl"):
-        if p.is_file():
-            yield p
+def _copytree_parallel(
+    src: Path,
+    dst: Path,
+    max_workers: int | None = None,
+    copy_function=_reflink_or_copy,
+) -> int:
+    """
+    shutil.copytree(src, dst, copy_function=copy_function) with the file
+    copies spread over a thread pool (model dirs hold many large shards;
+    copy_file_range/copy2 release the GIL). Symlinks are followed like
+    copytree(symlinks=False). Returns the number of files copied.
+    """
+    pairs: List[Tuple[str, str]] = []
+    dir_pairs: List[Tuple[str, str]] = []
+    src_root = str(src)
+    dst_root = str(dst)
+    for dirpath, _dirnames, filenames in os.walk(src_root, followlinks=True):
+        rel = os.path.relpath(dirpath, src_root)
+        out_dir = dst_root if rel == "." else os.path.join(dst_root, rel)
+        os.makedirs(out_dir, exist_ok=True)
+        dir_pairs.append((dirpath, out_dir))
+        for name in filenames:
+            pairs.append((os.path.join(dirpath, name), os.path.join(out_dir, name)))
+
+    if max_workers is None:
+        max_workers = min(16, (os.cpu_count() or 1) * 2)
+    workers = max(1, min(max_workers, len(pairs)))
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        list(ex.map(lambda pair: copy_function(*pair), pairs))
+    # Directory metadata last (children change dir mtimes), deepest first.
+    for src_dir, out_dir in reversed(dir_pairs):
+        shutil.copystat(src_dir, out_dir)
+    return len(pairs)
+
+
+def _link_one(
+    pair: Tuple[str, str],
+    at: Tuple[int, str, int, str] | None = None,
+) -> Tuple[str, str]:
+    """
+    Reflink/hardlink/copy one (src, dst). Returns ("ok", dst) or ("clash", dst) if dst already exists.
+    at=(src_dir_fd, src_rel, dst_dir_fd, dst_name) names the same two files relative to
+    already-open directories; reflink/link then use those instead of walking every
+    component of the absolute paths again. The copy fallback still uses pair.
+    """
+    src, dst = pair
+    src_dir_fd, link_src, dst_dir_fd, link_dst = at if at is not None else (None, src, None, dst)
+    try:
+        if _reflink(link_src, link_dst, src_dir_fd=src_dir_fd, dst_dir_fd=dst_dir_fd):
+            return "ok", dst
+        os.link(link_src, link_dst, src_dir_fd=src_dir_fd, dst_dir_fd=dst_dir_fd)
+    except FileExistsError:
+        return "clash", dst
+    except OSError:
+        # Cross-device etc.: fall back to copy, but never overwrite an existing file.
+        if os.path.exists(dst):
+            return "clash", dst
+        _kernel_copy(src, dst)
+    return "ok", dst
+
+
+def _read_copy_manifest(path: str) -> Dict[str, List]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
 
 
-def copy_jsonl_flat(src_dir: Path, dst_dir: Path) -> Tuple[int, List[str]]:
+def _write_copy_manifest(path: str, manifest: Dict[str, List]) -> None:
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def copy_jsonl_flat(src_dir: Path, dst_dir: Path, max_workers: int | None = None) -> Tuple[int, List[str]]:
+    """
+    Hardlink (or copy) every *.jsonl under src_dir into dst_dir, flattening
+    subdirs into '__'-joined names. Returns (copied, clashes).
+
+    dst_dir/.copied.json records flat_name -> [src, mtime_ns, size] for files
+    copied here. On rerun a name whose source is unchanged is skipped
+    silently, a name whose source changed is re-copied in place, and any
+    other existing name is reported as a clash.
+
+    The walk runs in this thread and feeds a bounded queue drained by link
+    worker threads, so directory reads overlap link/copy syscalls.
+    """
     dst_dir.mkdir(parents=True, exist_ok=True)
-    copied = 0
+    existing = set(os.listdir(dst_dir))
     clashes: List[str] = []
-    for p in iter_jsonl_files_recursive(src_dir):
-        rel = p.relative_to(src_dir)
-        # flatten: replace path separators with '__' to avoid subdirs
-        flat_name = "__".join(rel.parts)
-        out = dst_dir / flat_name
-        if out.exists():
-            clashes.append(str(out))
-            continue
-        out.parent.mkdir(parents=True, exist_ok=True)
-        _copy_or_link_file(str(p), str(out))
-        copied += 1
+    src_root = str(src_dir)
+    prefix_len = len(os.path.join(src_root, ""))
+    dst_root = str(dst_dir)
+    manifest_path = os.path.join(dst_root, COPY_MANIFEST_NAME)
+    manifest = _read_copy_manifest(manifest_path)
+    updates: Dict[str, List] = {}
+
+    if max_workers is None:
+        max_workers = min(32, (os.cpu_count() or 1) * 4)
+    workers = max(1, max_workers)
+    pending: "queue.Queue[Tuple[str, str, bool] | None]" = queue.Queue(maxsize=COPY_QUEUE_SIZE)
+    # Per-worker [copied, clashes, error]; merged after join, so no locking.
+    results: List[List] = [[0, [], None] for _ in range(workers)]
+
+    def worker(slot: List) -> None:
+        while True:
+            item = pending.get()
+            if item is None:
+                return
+            if slot[2] is not None:
+                continue  # keep draining so the walker never blocks
+            src, name, replace_existing = item
+            dst = os.path.join(dst_root, name)
+            try:
+                if replace_existing:
+                    tmp_name = name + ".tmp"
+                    try:
+                        os.unlink(tmp_name, dir_fd=dst_fd)
+                    except FileNotFoundError:
+                        pass
+                    status, _ = _link_one((src, dst + ".tmp"), (src_fd, src[prefix_len:], dst_fd, tmp_name))
+                    if status == "ok":
+                        os.replace(tmp_name, name, src_dir_fd=dst_fd, dst_dir_fd=dst_fd)
+                    else:
+                        try:
+                            os.unlink(tmp_name, dir_fd=dst_fd)
+                        except FileNotFoundError:
+                            pass
+                else:
+                    status, _ = _link_one((src, dst), (src_fd, src[prefix_len:], dst_fd, name))
+            except OSError as e:
+                slot[2] = e
+                continue
+            if status == "ok":
+                slot[0] += 1
+            else:
+                slot[1].append(dst)
+
+    # Open both roots once; link/reflink then resolve names relative to them
+    src_fd = os.open(src_root, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        dst_fd = os.open(dst_root, os.O_RDONLY | os.O_DIRECTORY)
+    except OSError:
+        os.close(src_fd)
+        raise
+    threads = [threading.Thread(target=worker, args=(slot,), daemon=True) for slot in results]
+    for t in threads:
+        t.start()
+    try:
+        for src in _scandir_jsonl(src_root):
+            # flatten: replace path separators with '__' to avoid subdirs
+            flat_name = src[prefix_len:].replace(os.sep, "__")
+            out = os.path.join(dst_root, flat_name)
+            st = os.stat(src)
+            record = [src, st.st_mtime_ns, st.st_size]
+            replace_existing = False
+            if flat_name in existing:
+                previous = manifest.get(flat_name)
+                if previous == record:
+                    continue  # copied earlier from the same, unchanged source
+                if not previous or previous[0] != src or flat_name in updates:
+                    clashes.append(out)
+                    continue
+                try:
+                    linked = os.path.samestat(st, os.stat(flat_name, dir_fd=dst_fd))
+                except FileNotFoundError:
+                    linked = False
+                if linked:
+                    # Hardlink of a source edited in place: dst already has the new
+                    # content, and rename() between two links of one inode is a no-op.
+                    updates[flat_name] = record
+                    continue
+                replace_existing = True  # same source path, content changed
+            existing.add(flat_name)
+            updates[flat_name] = record
+            pending.put((src, flat_name, replace_existing))
+    finally:
+        for _ in threads:
+            pending.put(None)
+        for t in threads:
+            t.join()
+        os.close(src_fd)
+        os.close(dst_fd)
+
+    copied = 0
+    for n_copied, worker_clashes, error in results:
+        if error is not None:
+            raise error
+        copied += n_copied
+        clashes.extend(worker_clashes)
+        # Lost a race with a file created outside this walk: not ours to record
+        for dst in worker_clashes:
+            updates.pop(os.path.basename(dst), None)
+    if updates:
+        manifest.update(updates)
+        _write_copy_manifest(manifest_path, manifest)
     return copied, clashes
 
 
@@ -350,7 +820,7 @@ def main(argv: List[str] | None = None) -> int:
     ap = argparse.ArgumentParser(prog="python scripts/prepare_exp.py")
     ap.add_argument("-c", "--config", required=True, help="Path to pipeline.py")
     args = ap.parse_args(argv)
-    pipeline_config_path = Path(args.config).expanduser().resolve()
+    pipeline_config_path = Path(os.path.abspath(Path(args.config).expanduser()))
     if not pipeline_config_path.exists():
         raise SystemExit(f"Config not found: {pipeline_config_path}")
 
@@ -364,12 +834,13 @@ def main(argv: List[str] | None = None) -> int:
         raise SystemExit("Only .py pipeline configs are supported")
     pipeline_config = config_utils.load_config_module(pipeline_config_path)
     config_utils.merge_env_defaults(pipeline_config, os.environ)
-    # Resolve variables
+    # Resolve variables: DATAPOOL_ROOT first (only it and what it references), then
+    # the whole config once against the final context.
     temp_context: Dict[str, str] = {}
     config_utils.apply_env_imports(temp_context, os.environ)
-    temp_resolved = config_utils.resolve_config_vars(pipeline_config, temp_context)
+    temp_resolved = config_utils.resolve_config_vars(pipeline_config, temp_context, keys=("DATAPOOL_ROOT",))
     pipeline_context = {
-        "DATAPOOL_ROOT": str(Path(temp_resolved.get("DATAPOOL_ROOT", "datapool")).expanduser().resolve()),
+        "DATAPOOL_ROOT": os.path.abspath(Path(temp_resolved.get("DATAPOOL_ROOT", "datapool")).expanduser()),
         "ROOT_DIR": str(root_dir),
     }
     config_utils.apply_env_imports(pipeline_context, os.environ)
@@ -2,21 +2,49 @@
 from __future__ import annotations
 
 import argparse
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
+import hashlib
+import json
 import os
+import queue
+import re
 import shutil
+import signal
 import subprocess
 import sys
+import tempfile
+import threading
 import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 # Allow "from utils.step_registry import ..." when run from scripts/
 _scripts_dir = Path(__file__).resolve().parent
 if str(_scripts_dir) not in sys.path:
     sys.path.insert(0, str(_scripts_dir))
+from utils.step_graph import (
+    append_step_timing,
+    build_generations,
+    format_plan,
+    load_step_weights,
+    order_by_cost,
+    to_dot,
+)
 from utils.step_registry import Step, get_step
 
+# Per-step wall times (json lines under WORKDIR), used to order steps that compete for slots.
+STEP_TIMINGS_NAME = "step_timings.jsonl"
+# Pipe read size when teeing step output to console + log
+TEE_CHUNK_SIZE = 64 << 10
+# Output dirs with more top-level entries than this are cleared with a thread pool
+CLEAR_PARALLEL_MIN_ENTRIES = 4
+# Serializes console writes from steps running in parallel
+_STDOUT_LOCK = threading.Lock()
+# Step processes still running; each leads its own process group (start_new_session)
+_LIVE_STEPS: set[subprocess.Popen] = set()
+_LIVE_STEPS_LOCK = threading.Lock()
+
 
 @dataclass(frozen=True)
 class StepInstance:
@@ -28,6 +56,7 @@ class StepInstance:
     - config_ref: optional override config path (relative to config_dir/ or absolute)
     - position: index in full pipeline sequence
     - occurrence_index: 0-based index among same step_type occurrences
+    - depends_on: instance ids that must finish before this one starts
     """
 
     step_type: str
@@ -35,19 +64,195 @@ class StepInstance:
     config_ref: Optional[str]
     position: int
     occurrence_index: int
+    depends_on: Tuple[str, ...] = ()
+
+
+_ts_cache: Tuple[int, str] = (0, "")
+
+
+def _ts() -> str:
+    """'%F %T' for now, formatted at most once per second."""
+    global _ts_cache
+    now = int(time.time())
+    if _ts_cache[0] != now:
+        _ts_cache = (now, time.strftime("%F %T", time.localtime(now)))
+    return _ts_cache[1]
+
+
+def log(msg: str) -> None:
+    """Print one progress line; a single write under the console lock, so parallel steps never split it."""
+    line = f"[{_ts()}] {msg}\n"
+    with _STDOUT_LOCK:
+        sys.stdout.write(line)
+
+
+def _write_all(fd: int, data: bytes) -> None:
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
 
 
-def tee_process(proc: subprocess.Popen, log_path: Path) -> int:
+def _echo(data: bytes) -> None:
+    """Write child output to our stdout, after anything print() has buffered."""
+    with _STDOUT_LOCK:
+        sys.stdout.flush()
+        out = getattr(sys.stdout, "buffer", None)
+        if out is None:
+            sys.stdout.write(data.decode("utf-8", errors="replace"))
+            sys.stdout.flush()
+            return
+        out.write(data)
+        out.flush()
+
+
+# Positions where a new console line starts (after \n, or after a bare \r progress update)
+_LINE_START_RE = re.compile(rb"(?:(?<=\n)|(?<=\r)(?!\n))(?=[\s\S])")
+
+
+def _prefix_lines(data: bytes, prefix: bytes, at_line_start: bool) -> bytes:
+    """Insert prefix at the start of every console line in data."""
+    data = _LINE_START_RE.sub(prefix, data)
+    return prefix + data if at_line_start else data
+
+
+def _log_writer(log_fd: int, chunks: "queue.SimpleQueue[bytes | None]", errors: List[OSError]) -> None:
+    """Drain chunks into log_fd until the None sentinel; keeps draining after an error."""
+    while True:
+        chunk = chunks.get()
+        if chunk is None:
+            return
+        if errors:
+            continue
+        try:
+            _write_all(log_fd, chunk)
+        except OSError as e:
+            errors.append(e)
+
+
+def tee_process(proc: subprocess.Popen, log_path: Path, console_prefix: str = "") -> int:
+    """
+    Copy the child's combined stdout/stderr to our stdout and log_path in
+    TEE_CHUNK_SIZE blocks from the binary pipe (no per-line Python work). The log
+    gets every block as is, written by a separate thread so a slow log filesystem
+    does not stop the pipe from draining; stdout only gets complete lines (or \r
+    progress updates), so steps running concurrently do not interleave mid-line.
+    With console_prefix, every stdout line (not the log) starts with it.
+    """
     log_path.parent.mkdir(parents=True, exist_ok=True)
-    with log_path.open("w", encoding="utf-8") as f:
-        assert proc.stdout is not None
-        for line in proc.stdout:
-            sys.stdout.write(line)
-            f.write(line)
-        return proc.wait()
+    assert proc.stdout is not None
+    src_fd = proc.stdout.fileno()
+    pending = b""
+    log_fd = os.open(log_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    chunks: "queue.SimpleQueue[bytes | None]" = queue.SimpleQueue()
+    errors: List[OSError] = []
+    writer = threading.Thread(target=_log_writer, args=(log_fd, chunks, errors), daemon=True)
+    writer.start()
+    prefix = console_prefix.encode("utf-8")
+    at_line_start = True
+
+    def echo(data: bytes) -> None:
+        nonlocal at_line_start
+        if prefix:
+            out = _prefix_lines(data, prefix, at_line_start)
+            at_line_start = data.endswith((b"\n", b"\r"))
+            data = out
+        _echo(data)
+
+    try:
+        while True:
+            chunk = os.read(src_fd, TEE_CHUNK_SIZE)
+            if not chunk:
+                break
+            chunks.put(chunk)
+            cut = max(chunk.rfind(b"\n"), chunk.rfind(b"\r")) + 1
+            if cut:
+                echo(pending + chunk[:cut])
+                pending = chunk[cut:]
+            else:
+                pending += chunk
+                if len(pending) >= TEE_CHUNK_SIZE:
+                    echo(pending)
+                    pending = b""
+        if pending:
+            echo(pending)
+    finally:
+        chunks.put(None)
+        writer.join()
+        os.close(log_fd)
+    code = proc.wait()
+    if errors:
+        print(f"[warn] failed writing step log {log_path}: {errors[0]}", file=sys.stderr)
+    return code
+
+
+def _kill_step_group(proc: subprocess.Popen, sig: int = signal.SIGTERM) -> None:
+    """Signal the step's whole process group (shell, launcher and anything it forked)."""
+    try:
+        os.killpg(proc.pid, sig)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def kill_live_steps() -> None:
+    with _LIVE_STEPS_LOCK:
+        procs = list(_LIVE_STEPS)
+    for proc in procs:
+        _kill_step_group(proc)
+
+
+_DIR_OPEN_FLAGS = os.O_RDONLY | os.O_DIRECTORY | getattr(os, "O_NOFOLLOW", 0)
+
+
+def _clear_entry(dir_fd: int, entry: os.DirEntry, dry_run: bool) -> int:
+    """Remove one entry of the directory open as dir_fd (recursively for dirs); return non-directory entries removed."""
+    if entry.is_dir(follow_symlinks=False):
+        sub_fd = os.open(entry.name, _DIR_OPEN_FLAGS, dir_fd=dir_fd)
+        try:
+            file_count = _clear_fd(sub_fd, dry_run)
+        finally:
+            os.close(sub_fd)
+        if not dry_run:
+            os.rmdir(entry.name, dir_fd=dir_fd)
+        return file_count
+    if not dry_run:
+        os.unlink(entry.name, dir_fd=dir_fd)
+    return 1
 
 
-def clear_output_directory(output_dir: Path, step_name: str, dry_run: bool = False) -> None:
+def _clear_fd(dir_fd: int, dry_run: bool, max_workers: int = 1) -> int:
+    with os.scandir(dir_fd) as it:
+        entries = list(it)
+    if max_workers > 1 and len(entries) > CLEAR_PARALLEL_MIN_ENTRIES:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(entries))) as ex:
+            return sum(ex.map(lambda entry: _clear_entry(dir_fd, entry, dry_run), entries))
+    return sum(_clear_entry(dir_fd, entry, dry_run) for entry in entries)
+
+
+def _clear_tree(path: str, dry_run: bool, max_workers: int = 1) -> int:
+    """
+    Remove everything under path (keeping path itself) in one os.scandir walk and
+    return the number of non-directory entries (files, symlinks) removed.
+    DirEntry answers is_dir from the readdir d_type, so there is no stat per
+    entry. Each directory is opened once and its entries are unlinked/rmdir'd
+    relative to that fd (unlinkat), so the kernel never re-walks the full path.
+    Symlinks are removed, never followed. dry_run only counts.
+    With max_workers > 1 and more than CLEAR_PARALLEL_MIN_ENTRIES top-level
+    entries, those entries are cleared concurrently (e.g. per-shard dirs).
+    """
+    # path itself may be a symlink to the real output dir; only entries below it are never followed.
+    dir_fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        return _clear_fd(dir_fd, dry_run, max_workers)
+    finally:
+        os.close(dir_fd)
+
+
+def clear_output_directory(
+    output_dir: Path,
+    step_name: str,
+    dry_run: bool = False,
+    datapool_root: Optional[Path] = None,
+) -> None:
     """
     Clear output directory before running a step.
     
@@ -55,19 +260,29 @@ def clear_output_directory(output_dir: Path, step_name: str, dry_run: bool = Fal
         output_dir: Directory to clear
         step_name: Step name for logging
         dry_run: If True, only print what would be cleared
+        datapool_root: If output_dir is inside it, top-level entries are removed in parallel
     """
-    if not output_dir.exists():
+    # One scandir probe: missing and already-empty dirs (the first-run case) return here.
+    try:
+        with os.scandir(output_dir) as it:
+            if next(it, None) is None:
+                return
+    except FileNotFoundError:
         return
-    
-    if not output_dir.is_dir():
+    except NotADirectoryError:
         # If it's a file, remove it
         if not dry_run:
             output_dir.unlink()
         return
     
-    # Count files before clearing
-    files_before = list(output_dir.rglob("*"))
-    file_count = len([f for f in files_before if f.is_file()])
+    # Clear directory contents (but keep the directory itself), counting files on the way
+    # Parallel removal only inside the datapool, so a mistyped path is never fanned out over.
+    max_workers = 1
+    if datapool_root is not None:
+        dp_real = datapool_root.resolve()
+        if dp_real in output_dir.resolve().parents:
+            max_workers = min(16, (os.cpu_count() or 1) * 2)
+    file_count = _clear_tree(str(output_dir), dry_run, max_workers)
     
     if file_count == 0:
         return
@@ -76,14 +291,24 @@ def clear_output_directory(output_dir: Path, step_name: str, dry_run: bool = Fal
         print(f"[dry-run] {step_name}: would clear {file_count} files from {output_dir}")
         return
     
-    # Clear directory contents (but keep the directory itself)
-    for item in output_dir.iterdir():
-        if item.is_file():
-            item.unlink()
-        elif item.is_dir():
-            shutil.rmtree(item)
-    
-    print(f"[{time.strftime('%F %T')}] {step_name}: cleared {file_count} files from {output_dir}")
+    log(f"{step_name}: cleared {file_count} files from {output_dir}")
+
+
+def make_handoff_dir(pipeline_env: Dict[str, str], workdir: Path, run_id: str) -> Path:
+    """
+    Create the per-run scratch dir for intermediates passed between steps
+    (e.g. mg2hf_0 -> hf2mg_0). Prefers tmpfs (/dev/shm) so handoffs skip disk.
+    HANDOFF_ROOT in pipeline.py overrides the location.
+    """
+    root_str = pipeline_env.get("HANDOFF_ROOT", "").strip()
+    if root_str:
+        root = Path(root_str).expanduser()
+    elif os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK):
+        root = Path("/dev/shm")
+    else:
+        root = workdir / "handoff"
+    root.mkdir(parents=True, exist_ok=True)
+    return Path(tempfile.mkdtemp(prefix=f"llmrunner_{run_id}_", dir=root))
 
 
 def _load_step_config(
@@ -100,26 +325,38 @@ def _load_step_config(
         "DATAPOOL_ROOT": str(datapool_root),
         "ROOT_DIR": str(root_dir),
     }
-    for key in ["MODEL_PREFIX", "BASE_MODEL_PATH", "MEGATRON", "MINDSPEED"]:
+    for key in ["MODEL_PREFIX", "BASE_MODEL_PATH", "MEGATRON", "MINDSPEED", "HANDOFF_DIR"]:
         if key in pipeline_env:
             context[key] = pipeline_env[key]
     return resolve_config_vars(config, context)
 
 
-def get_step_output_dir(
-    step_obj: Step,
-    step_instance: StepInstance,
-    config_dir: Path,
+def load_step_config_or_empty(
+    step_config_path: Path,
+    step_config_exists: bool,
     root_dir: Path,
     datapool_root: Path,
     pipeline_env: Dict[str, str],
-) -> Optional[Path]:
-    """Get the output directory for a step by loading its config. Returns None if not clearable."""
-    step_config_path = resolve_step_config_path(step_obj, step_instance, config_dir)
-    if not step_config_path.exists():
+) -> Dict[str, Any]:
+    """_load_step_config, or {} when the file is missing or fails to load."""
+    if not step_config_exists:
+        return {}
+    try:
+        return _load_step_config(
+            step_config_path=step_config_path,
+            root_dir=root_dir,
+            datapool_root=datapool_root,
+            pipeline_env=pipeline_env,
+        )
+    except Exception:
+        return {}
+
+
+def get_step_output_dir(step_obj: Step, config: Dict[str, Any], datapool_root: Path) -> Optional[Path]:
+    """Get the output directory for a step from its resolved config. Returns None if not clearable."""
+    if not config:
         return None
     try:
-        config = _load_step_config(step_config_path, root_dir, datapool_root, pipeline_env)
         return step_obj.get_output_dir(config, datapool_root)
     except Exception:
         return None
@@ -134,12 +371,16 @@ def _normalize_instance_dict(item: Dict[str, Any], idx: int) -> Dict[str, Any]:
       - id (optional)
       - config (optional)
       - enabled (optional, default true)
+      - depends_on (optional, list of instance ids; default: previous step)
+
+    Canonical entries (already using 'type') are returned as is, without a copy;
+    only the 'step' alias is rewritten, into a new dict.
     """
-    if "type" not in item and "step" in item:
-        item["type"] = item["step"]
-    if "type" not in item:
-        raise SystemExit(f"STEPS[{idx}] object must include 'type' (or 'step')")
-    return item
+    if "type" in item:
+        return item
+    if "step" in item:
+        return {**item, "type": item["step"]}
+    raise SystemExit(f"STEPS[{idx}] object must include 'type' (or 'step')")
 
 
 def _parse_enabled(value: Any) -> bool:
@@ -157,6 +398,17 @@ def _parse_enabled(value: Any) -> bool:
     raise SystemExit(f"Invalid enabled value: {value!r}. Use true/false.")
 
 
+def _parse_depends_on(value: Any, idx: int) -> Tuple[str, ...]:
+    """Parse depends_on from str/list/tuple into a tuple of instance ids."""
+    if value is None:
+        return ()
+    if isinstance(value, str):
+        return tuple(x for x in value.replace(",", " ").split() if x)
+    if isinstance(value, (list, tuple)):
+        return tuple(str(x) for x in value)
+    raise SystemExit(f"Invalid STEPS[{idx}].depends_on: {value!r}. Use a list of step ids.")
+
+
 def _canonical_instance_id(step_type: str, occurrence_index: int) -> str:
     """Build canonical instance id: type_idx."""
     return f"{step_type}_{occurrence_index}"
@@ -169,6 +421,9 @@ def _resolve_steps(pipeline_config: Dict[str, Any]) -> List[StepInstance]:
     - Supports:
       1) string entries: ["train_cpt", "train_cpt", ...]
       2) object entries: [{"id":"train_cpt_0","type":"train_cpt","config":"steps/train_cpt_0.py"}, ...]
+    - Entries without depends_on depend on the previous enabled entry, so a
+      plain list keeps running serially in STEPS order.
+    - enabled=False entries are pruned here, before their configs are loaded.
     """
     steps_raw = pipeline_config.get("STEPS")
     if steps_raw is None:
@@ -179,39 +434,44 @@ def _resolve_steps(pipeline_config: Dict[str, Any]) -> List[StepInstance]:
     seen_counts: Dict[str, int] = {}
     instances: List[StepInstance] = []
     used_ids: set[str] = set()
+    disabled_deps: Dict[str, Tuple[str, ...]] = {}
 
     for idx, raw in enumerate(steps_raw):
         enabled = True
         config_ref: Optional[str] = None
+        depends_on: Optional[Tuple[str, ...]] = None
 
         if isinstance(raw, str):
             step_type = raw
             explicit_id: Optional[str] = None
         elif isinstance(raw, dict):
-            item = _normalize_instance_dict(dict(raw), idx)
+            item = _normalize_instance_dict(raw, idx)
             step_type = str(item["type"])
             explicit_id = str(item["id"]) if item.get("id") is not None else None
             config_ref = str(item["config"]) if item.get("config") is not None else None
             if "enabled" in item:
                 enabled = _parse_enabled(item["enabled"])
+            if "depends_on" in item:
+                depends_on = _parse_depends_on(item["depends_on"], idx)
         else:
             raise SystemExit(f"Unsupported STEPS[{idx}] entry type: {type(raw).__name__}")
 
         if not enabled:
+            # Pruned before any config load; remember its upstream so
+            # dependents can be spliced onto it.
+            if explicit_id is not None:
+                if depends_on is None:
+                    depends_on = (instances[-1].instance_id,) if instances else ()
+                disabled_deps[explicit_id] = depends_on
             continue
 
-        occurrence_index = seen_counts.get(step_type, 0)
-        seen_counts[step_type] = occurrence_index + 1
-        canonical_id = _canonical_instance_id(step_type, occurrence_index)
-        if explicit_id is None:
-            instance_id = canonical_id
-        else:
-            instance_id = explicit_id
-            if instance_id != canonical_id:
-                raise SystemExit(
-                    f"Invalid STEPS[{idx}].id={instance_id!r}; expected {canonical_id!r} "
-                    f"for type={step_type!r} occurrence={occurrence_index}"
-                )
+        seen_counts[step_type] = occurrence_index = seen_counts.get(step_type, -1) + 1
+        instance_id = _canonical_instance_id(step_type, occurrence_index)
+        if explicit_id is not None and explicit_id != instance_id:
+            raise SystemExit(
+                f"Invalid STEPS[{idx}].id={explicit_id!r}; expected {instance_id!r} "
+                f"for type={step_type!r} occurrence={occurrence_index}"
+            )
         if config_ref and Path(config_ref).stem != instance_id:
             raise SystemExit(
                 f"Invalid STEPS[{idx}].config={config_ref!r}; filename stem must equal id={instance_id!r}"
@@ -221,6 +481,9 @@ def _resolve_steps(pipeline_config: Dict[str, Any]) -> List[StepInstance]:
             raise SystemExit(f"Duplicate step instance id in STEPS: {instance_id!r}")
         used_ids.add(instance_id)
 
+        if depends_on is None:
+            depends_on = (instances[-1].instance_id,) if instances else ()
+
         instances.append(
             StepInstance(
                 step_type=step_type,
@@ -228,12 +491,37 @@ def _resolve_steps(pipeline_config: Dict[str, Any]) -> List[StepInstance]:
                 config_ref=config_ref,
                 position=len(instances),
                 occurrence_index=occurrence_index,
+                depends_on=depends_on,
             )
         )
 
+    # A dependency on a disabled step is replaced by that step's own
+    # (transitive) dependencies, so pruning a node keeps upstream ordering.
+    if disabled_deps:
+        instances = [
+            replace(inst, depends_on=_splice_disabled(inst.depends_on, disabled_deps))
+            for inst in instances
+        ]
     return instances
 
 
+def _splice_disabled(depends_on: Tuple[str, ...], disabled_deps: Dict[str, Tuple[str, ...]]) -> Tuple[str, ...]:
+    """Replace disabled ids in depends_on with their upstream ids (deduplicated, order kept)."""
+    out: List[str] = []
+    stack = list(reversed(depends_on))
+    visited: set[str] = set()
+    while stack:
+        dep = stack.pop()
+        if dep in visited:
+            continue
+        visited.add(dep)
+        if dep in disabled_deps:
+            stack.extend(reversed(disabled_deps[dep]))
+        else:
+            out.append(dep)
+    return tuple(out)
+
+
 def resolve_step_config_path(step_obj: Step, step_instance: StepInstance, config_dir: Path) -> Path:
     """
     Resolve config path for a step instance:
@@ -248,77 +536,96 @@ def resolve_step_config_path(step_obj: Step, step_instance: StepInstance, config
     return (config_dir / "steps" / f"{step_instance.instance_id}.py").resolve()
 
 
-def run_step(
+def probe_step_configs(steps_to_run: List[StepInstance], config_dir: Path) -> Dict[str, Tuple[Path, bool]]:
+    """
+    Resolve every instance's config path and whether it exists, once at pipeline
+    start: a single os.scandir of steps/ answers the instance-bound configs; only
+    config_ref paths outside steps/ are stat'ed individually.
+    """
+    steps_dir = config_dir / "steps"
+    try:
+        with os.scandir(steps_dir) as it:
+            step_files = {entry.name for entry in it if entry.is_file()}
+    except FileNotFoundError:
+        step_files = set()
+    steps_dir_real = steps_dir.resolve()
+    probed: Dict[str, Tuple[Path, bool]] = {}
+    for step_instance in steps_to_run:
+        path = resolve_step_config_path(get_step(step_instance.step_type), step_instance, config_dir)
+        if path.parent == steps_dir_real:
+            exists = path.name in step_files
+        else:
+            exists = path.is_file()
+        probed[step_instance.instance_id] = (path, exists)
+    return probed
+
+
+def build_env_template(
+    pipeline_env: Dict[str, str],
     *,
     root_dir: Path,
     config_dir: Path,
-    step_obj: Step,
-    step_instance: StepInstance,
-    pipeline_env: Dict[str, str],
     run_id: str,
     workdir: Path,
     log_dir: Path,
-) -> None:
-    dry_run = pipeline_env.get("DRY_RUN", "0")
-    step_name = step_obj.name
-    step_index = step_instance.position
-
-    def log(msg: str) -> None:
-        ts = time.strftime("%F %T")
-        print(f"[{ts}] {msg}")
-
-    step_config_path = resolve_step_config_path(step_obj, step_instance, config_dir)
-
+) -> Dict[str, str]:
+    """Environment shared by every step: os.environ plus run-level and exported pipeline keys."""
     env = os.environ.copy()
-    datapool_root = pipeline_env.get("DATAPOOL_ROOT", str(root_dir / "datapool"))
-    try:
-        repo_real = root_dir.resolve()
-        dp_real = Path(datapool_root).expanduser().resolve()
-        if repo_real not in dp_real.parents and dp_real != repo_real:
-            print(f"[warn] DATAPOOL_ROOT is outside repo: {dp_real}", file=sys.stderr)
-    except Exception:
-        pass
-
     env.update(
         {
             "ROOT_DIR": str(root_dir),
             "CONFIG_DIR": str(config_dir),
-            "STEP_ENV_PATH": str(step_config_path),
-            "STEP_INDEX": str(step_index),
-            "STEP_OCCURRENCE_INDEX": str(step_instance.occurrence_index),
-            "STEP_ID": step_instance.instance_id,
-            "STEP_TYPE": step_instance.step_type,
             "RUN_ID": run_id,
             "WORKDIR": str(workdir),
             "LOG_DIR": str(log_dir),
-            "DRY_RUN": dry_run,
-            "DATAPOOL_ROOT": datapool_root,
+            "DRY_RUN": pipeline_env.get("DRY_RUN", "0"),
+            "DATAPOOL_ROOT": pipeline_env.get("DATAPOOL_ROOT", str(root_dir / "datapool")),
         }
     )
     for key in [
         "BASE_MODEL_NAME", "BASE_MODEL_SRC", "BASE_MODEL_PATH",
         "TOKENIZER_PATH", "SFT_TOKENIZER_PATH",
-        "MODEL_PREFIX", "MEGATRON", "MINDSPEED", "ROOT",
+        "MODEL_PREFIX", "MEGATRON", "MINDSPEED", "ROOT", "HANDOFF_DIR",
     ]:
         if key in pipeline_env:
             env[key] = pipeline_env[key]
+    return env
 
-    output_dir = get_step_output_dir(step_obj, step_instance, config_dir, root_dir, Path(datapool_root), pipeline_env)
-    if output_dir:
-        clear_output_directory(output_dir, step_instance.instance_id, dry_run=(dry_run == "1"))
 
-    # Load resolved step config once for script-mode execution and env export.
-    resolved_step_config: Dict[str, Any] = {}
-    if step_config_path.exists():
-        try:
-            resolved_step_config = _load_step_config(
-                step_config_path=step_config_path,
-                root_dir=root_dir,
-                datapool_root=Path(datapool_root),
-                pipeline_env=pipeline_env,
-            )
-        except Exception:
-            resolved_step_config = {}
+def run_step(
+    *,
+    root_dir: Path,
+    step_obj: Step,
+    step_instance: StepInstance,
+    step_config_path: Path,
+    step_config_exists: bool,
+    pipeline_env: Dict[str, str],
+    env_template: Dict[str, str],
+    log_dir: Path,
+    resolved_step_config: Optional[Dict[str, Any]] = None,
+    console_prefix: str = "",
+) -> None:
+    dry_run = pipeline_env.get("DRY_RUN", "0")
+    step_name = step_obj.name
+    step_index = step_instance.position
+
+    datapool_root = env_template["DATAPOOL_ROOT"]
+
+    # Load resolved step config once for output dir, script-mode execution and env export
+    # (main usually hands in a copy preloaded while the previous generation ran).
+    if resolved_step_config is None:
+        resolved_step_config = load_step_config_or_empty(
+            step_config_path, step_config_exists, root_dir, Path(datapool_root), pipeline_env
+        )
+
+    output_dir = get_step_output_dir(step_obj, resolved_step_config, Path(datapool_root))
+    if output_dir:
+        clear_output_directory(
+            output_dir,
+            step_instance.instance_id,
+            dry_run=(dry_run == "1"),
+            datapool_root=Path(datapool_root),
+        )
 
     # Execution mode: explicit SCRIPT from step config (required).
     script_cmd = str(resolved_step_config.get("SCRIPT", "")).strip()
@@ -331,11 +638,17 @@ def run_step(
         else:
             script_cwd = script_cwd.resolve()
 
-    # Export resolved config values as env for script mode.
-    for key, value in resolved_step_config.items():
-        if not isinstance(key, str):
-            continue
-        env[key] = str(value)
+    # One shallow copy of the shared template, then the per-step keys and the
+    # resolved config values (already str from resolve_config_vars).
+    env = {
+        **env_template,
+        "STEP_ENV_PATH": str(step_config_path),
+        "STEP_INDEX": str(step_index),
+        "STEP_OCCURRENCE_INDEX": str(step_instance.occurrence_index),
+        "STEP_ID": step_instance.instance_id,
+        "STEP_TYPE": step_instance.step_type,
+        **resolved_step_config,
+    }
 
     log_name = step_instance.instance_id
     log(f"run step[{step_index}] id={step_instance.instance_id} type={step_name}")
@@ -348,21 +661,49 @@ def run_step(
     if dry_run == "1":
         print(f"[dry-run] (cd {script_cwd} && {script_cmd})")
         return
-    proc = subprocess.Popen(
-        script_cmd,
+    start_ts = time.time()
+    log_file = log_dir / f"{log_name}.log"
+    popen_kwargs: Dict[str, Any] = dict(
         shell=True,
         cwd=str(script_cwd),
         env=env,
-        stdout=subprocess.PIPE,
         stderr=subprocess.STDOUT,
-        text=True,
-        bufsize=1,
+        close_fds=True,
+        # Own process group, so a failed or interrupted step can be torn down
+        # together with workers it left behind (see kill_live_steps).
+        start_new_session=True,
     )
-    log_file = log_dir / f"{log_name}.log"
-    code = tee_process(proc, log_file)
+    tee_to_stdout = pipeline_env.get("TEE_TO_STDOUT", "1") != "0"
+    if tee_to_stdout:
+        proc = subprocess.Popen(script_cmd, stdout=subprocess.PIPE, bufsize=0, **popen_kwargs)
+    else:
+        # The child writes straight into the log file; nothing passes through this process.
+        with open(log_file, "wb") as log_out:
+            proc = subprocess.Popen(script_cmd, stdout=log_out, **popen_kwargs)
+    with _LIVE_STEPS_LOCK:
+        _LIVE_STEPS.add(proc)
+    code: Optional[int] = None
+    try:
+        code = tee_process(proc, log_file, console_prefix) if tee_to_stdout else proc.wait()
+    finally:
+        with _LIVE_STEPS_LOCK:
+            _LIVE_STEPS.discard(proc)
+        if code != 0:
+            _kill_step_group(proc)
     if code != 0:
         raise SystemExit(f"step failed: id={step_instance.instance_id} type={step_name} (exit={code}), see log: {log_file}")
     log(f"done step[{step_index}] id={step_instance.instance_id} type={step_name}")
+    config_blob = json.dumps(resolved_step_config, sort_keys=True, default=str).encode("utf-8")
+    append_step_timing(
+        Path(env_template["WORKDIR"]) / STEP_TIMINGS_NAME,
+        {
+            "step_id": step_instance.instance_id,
+            "type": step_instance.step_type,
+            "start_ts": round(start_ts, 3),
+            "end_ts": round(time.time(), 3),
+            "input_hash": hashlib.sha256(config_blob).hexdigest()[:16],
+        },
+    )
 
 
 def main(argv: List[str] | None = None) -> int:
@@ -394,12 +735,12 @@ def main(argv: List[str] | None = None) -> int:
     merge_env_defaults(pipeline_config, os.environ)
     # Resolve steps to run from explicit STEPS before str() conversion
     steps_to_run = _resolve_steps(pipeline_config)
-    # First resolve DATAPOOL_ROOT to get the actual path
-    temp_context = {}
+    # Resolve only DATAPOOL_ROOT (and what it references) first, then every
+    # variable once with the absolute DATAPOOL_ROOT in context.
+    temp_context: Dict[str, str] = {}
     apply_env_imports(temp_context, os.environ)
-    temp_resolved = resolve_config_vars(pipeline_config, temp_context)
+    temp_resolved = resolve_config_vars(pipeline_config, temp_context, keys=("DATAPOOL_ROOT",))
     datapool_root_temp = Path(temp_resolved.get("DATAPOOL_ROOT", str(root_dir / "datapool"))).expanduser().resolve()
-    # Now resolve all variables with full context
     pipeline_context = {
         "DATAPOOL_ROOT": str(datapool_root_temp),
         "ROOT_DIR": str(root_dir),
@@ -425,28 +766,134 @@ def main(argv: List[str] | None = None) -> int:
     workdir.mkdir(parents=True, exist_ok=True)
     log_dir.mkdir(parents=True, exist_ok=True)
 
-    print(
-        f"[{time.strftime('%F %T')}] run_id={run_id} config_dir={config_dir} workdir={workdir} datapool_root={datapool_root} dry_run={pipeline_env.get('DRY_RUN','0')}"
+    log(
+        f"run_id={run_id} config_dir={config_dir} workdir={workdir} datapool_root={datapool_root} dry_run={pipeline_env.get('DRY_RUN','0')}"
     )
+    if datapool_root != root_dir and root_dir not in datapool_root.parents:
+        print(f"[warn] DATAPOOL_ROOT is outside repo: {datapool_root}", file=sys.stderr)
 
     if args.prepare_only:
-        print(f"[{time.strftime('%F %T')}] prepare-only: done (no steps executed)")
+        log("prepare-only: done (no steps executed)")
         return 0
 
-    for step_instance in steps_to_run:
-        step_obj = get_step(step_instance.step_type)
+    # Stat every step config up front so a missing one fails before any step runs.
+    step_configs = probe_step_configs(steps_to_run, config_dir)
+    missing = [
+        f"id={inst.instance_id} config={step_configs[inst.instance_id][0]}"
+        for inst in steps_to_run
+        if not step_configs[inst.instance_id][1]
+    ]
+    if missing:
+        raise SystemExit("step config not found:\n  " + "\n  ".join(missing))
+
+    generations = build_generations(steps_to_run)
+    max_parallel = int(pipeline_env.get("MAX_PARALLEL_STEPS", "0") or "0")
+    step_weights = load_step_weights(workdir / STEP_TIMINGS_NAME)
+
+    if pipeline_env.get("DRY_RUN", "0") == "1":
+        for line in format_plan(generations):
+            print(f"[dry-run] {line}")
+        dot_path = log_dir / "dag.dot"
+        dot_path.write_text(to_dot(steps_to_run), encoding="utf-8")
+        print(f"[dry-run] dag written to {dot_path}")
+
+    # Step configs of the next generation are loaded and resolved on one background
+    # thread while the current generation runs (one generation of lookahead).
+    config_loader = ThreadPoolExecutor(max_workers=1)
+    preloaded: Dict[str, Future] = {}
+
+    def _preload(generation: List[StepInstance]) -> None:
+        for inst in generation:
+            path, exists = step_configs[inst.instance_id]
+            preloaded[inst.instance_id] = config_loader.submit(
+                load_step_config_or_empty,
+                path,
+                exists,
+                root_dir,
+                Path(env_template["DATAPOOL_ROOT"]),
+                pipeline_env,
+            )
+
+    def _run(step_instance: StepInstance, console_prefix: str = "") -> None:
+        step_config_path, step_config_exists = step_configs[step_instance.instance_id]
+        fut = preloaded.pop(step_instance.instance_id, None)
         run_step(
             root_dir=root_dir,
-            config_dir=config_dir,
-            step_obj=step_obj,
+            step_obj=get_step(step_instance.step_type),
             step_instance=step_instance,
+            step_config_path=step_config_path,
+            step_config_exists=step_config_exists,
             pipeline_env=pipeline_env,
-            run_id=run_id,
-            workdir=workdir,
+            env_template=env_template,
             log_dir=log_dir,
+            resolved_step_config=fut.result() if fut is not None else None,
+            console_prefix=console_prefix,
         )
 
-    print(f"[{time.strftime('%F %T')}] pipeline finished")
+    handoff_dir = make_handoff_dir(pipeline_env, workdir, run_id)
+    pipeline_env["HANDOFF_DIR"] = str(handoff_dir)
+    env_template = build_env_template(
+        pipeline_env,
+        root_dir=root_dir,
+        config_dir=config_dir,
+        run_id=run_id,
+        workdir=workdir,
+        log_dir=log_dir,
+    )
+    try:
+        for gen_index, generation in enumerate(generations):
+            if gen_index + 1 < len(generations):
+                _preload(generations[gen_index + 1])
+            if len(generation) == 1:
+                _run(generation[0])
+                continue
+            workers = min(len(generation), max_parallel) if max_parallel > 0 else len(generation)
+            if workers < len(generation):
+                # Not everything fits: start the longest expected steps first.
+                generation = order_by_cost(generation, step_weights)
+            log(f"generation[{gen_index}]: {[inst.instance_id for inst in generation]} (parallel={workers})")
+            with ThreadPoolExecutor(max_workers=workers) as ex:
+                pending = list(generation)
+                running: Dict[Future, StepInstance] = {}
+                busy_groups: set[str] = set()
+                while pending or running:
+                    # Start ready steps in order, skipping those whose resource group
+                    # (e.g. "gpu") is busy, so a waiting step never holds a slot.
+                    for inst in list(pending):
+                        if len(running) >= workers:
+                            break
+                        group = get_step(inst.step_type).resource_group
+                        if group in busy_groups:
+                            continue
+                        if group:
+                            busy_groups.add(group)
+                        pending.remove(inst)
+                        prefix = f"[{inst.instance_id}] " if workers > 1 else ""
+                        running[ex.submit(_run, inst, prefix)] = inst
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    failed: Optional[Future] = None
+                    for fut in done:
+                        busy_groups.discard(get_step(running.pop(fut).step_type).resource_group)
+                        if failed is None and fut.exception() is not None:
+                            failed = fut
+                    if failed is not None:
+                        # Fail fast: report now, never start the rest, stop the running siblings.
+                        log(
+                            f"generation[{gen_index}]: {failed.exception()}; "
+                            f"stopping {[inst.instance_id for inst in running.values()]}, "
+                            f"skipping {[inst.instance_id for inst in pending]}"
+                        )
+                        kill_live_steps()
+                        raise failed.exception()
+    except BaseException:
+        # Steps run in their own sessions and miss the terminal's Ctrl-C.
+        kill_live_steps()
+        raise
+    finally:
+        config_loader.shutdown(wait=False, cancel_futures=True)
+        shutil.rmtree(handoff_dir, ignore_errors=True)
+
+    log("pipeline finished")
     return 0
 
 
@@ -4,6 +4,8 @@ MG → HF: atomic (EXTERN_SCRIPT) or full export (CONVERT_CMD + COPY_HF_*).
 """
 from __future__ import annotations
 
+import functools
+import hashlib
 import os
 import shutil
 import subprocess
@@ -15,6 +17,36 @@ from config import load_config_module, resolve_config_vars, require_config, requ
 from step_utils import apply_pipeline_context, run_extern_script
 
 
+@functools.lru_cache(maxsize=None)
+def _sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _same_content(src: Path, dst: Path) -> bool:
+    """True if dst already holds src's bytes (same inode, or same size + sha256)."""
+    src_st = src.stat()
+    dst_st = dst.stat()
+    if (src_st.st_dev, src_st.st_ino) == (dst_st.st_dev, dst_st.st_ino):
+        return True
+    if src_st.st_size != dst_st.st_size:
+        return False
+    return _sha256(str(src)) == _sha256(str(dst))
+
+
+def _link_or_copy(src: Path, dst: Path) -> str:
+    """Hardlink src to dst, falling back to copy2 across devices. Returns the mode used."""
+    try:
+        os.link(src, dst)
+        return "link"
+    except OSError:
+        shutil.copy2(src, dst)
+        return "copy"
+
+
 def main() -> int:
     root_dir = Path(os.environ["ROOT_DIR"])
     datapool_root = Path(os.environ.get("DATAPOOL_ROOT", "datapool"))
@@ -75,6 +107,8 @@ def main() -> int:
         copy_from = config.get("COPY_HF_FROM")
         copy_files = config.get("COPY_HF_FILES")
         copy_overwrite = str(config.get("COPY_HF_OVERWRITE", "0")) == "1"
+        # COPY_HF_LINK=1 hardlinks instead of copying; only safe if nothing rewrites these files in place
+        copy_link = str(config.get("COPY_HF_LINK", "0")) == "1"
         subdir_key = "COPY_HF_BEFORE_SUBDIR" if when == "before" else "COPY_HF_SUBDIR"
         subdir = config.get(subdir_key, "")
         if not out_hf_dir or not copy_from or not copy_files:
@@ -88,16 +122,28 @@ def main() -> int:
         if copy_from.exists():
             out_hf_dir.mkdir(parents=True, exist_ok=True)
             copied = 0
+            hits = 0
             for name in copy_files:
                 src = copy_from / name
                 dst = out_hf_dir / name
                 if not src.exists():
                     continue
-                if dst.exists() and not copy_overwrite:
-                    continue
-                shutil.copy2(src, dst)
+                if dst.exists():
+                    if not copy_overwrite:
+                        continue
+                    if _same_content(src, dst):
+                        print(f"mg2hf: cache.hit {name} ({when})")
+                        hits += 1
+                        continue
+                    dst.unlink()
+                if copy_link:
+                    mode = _link_or_copy(src, dst)
+                else:
+                    shutil.copy2(src, dst)
+                    mode = "copy"
+                print(f"mg2hf: cache.miss {name} mode={mode} ({when})")
                 copied += 1
-            print(f"mg2hf: copied {copied} hf files from {copy_from} -> {out_hf_dir} ({when})")
+            print(f"mg2hf: copied {copied} hf files from {copy_from} -> {out_hf_dir} ({when}, unchanged={hits})")
 
     if str(config.get("COPY_HF_BEFORE", "0")) == "1":
         copy_hf_files("before")
@@ -13,7 +13,15 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent.parent / "utils"))
 from config import load_config_module, merge_env_defaults, resolve_config_vars, require_config, require_path_exists
 from step_utils import apply_pipeline_context, resolve_path, run_extern_script
-from tokenize_utils import expand_input_pattern
+from tokenize_utils import (
+    clear_tokenize_cache_key,
+    expand_input_pattern,
+    preload_tokenized_outputs,
+    resolve_partitions,
+    tokenize_cache_hit,
+    tokenize_cache_key,
+    write_tokenize_cache_key,
+)
 
 
 def main() -> int:
@@ -75,7 +83,11 @@ def main() -> int:
     
     # Optional config with defaults
     workers = int(config.get("WORKERS", "16"))
-    partitions = int(config.get("PARTITIONS", "16"))
+    partitions, workers = resolve_partitions(
+        str(config.get("PARTITIONS", "16")),
+        workers,
+        int(config.get("WORKERS_PER_PARTITION", "16")),
+    )
     log_interval = int(config.get("LOG_INTERVAL", "100000"))
     json_keys = config.get("JSON_KEYS", "text")
     tokenizer_type = config.get("TOKENIZER_TYPE", "HuggingFaceTokenizer")
@@ -84,6 +96,9 @@ def main() -> int:
     shuffle_jsonl = str(config.get("SHUFFLE_JSONL", "0")) == "1"
     shuffle_seed = config.get("SHUFFLE_SEED")
     shuffle_buffer = int(config.get("SHUFFLE_BUFFER", "10000"))
+    shuffle_mode = str(config.get("SHUFFLE_MODE", "block")).strip().lower()
+    tokenize_cache = str(config.get("TOKENIZE_CACHE", "1")) == "1"
+    preload_bin = str(config.get("PRELOAD_BIN", "0"))
     
     print("tokenize_cpt: starting")
     
@@ -105,27 +120,21 @@ def main() -> int:
     if dry_run:
         input_abs = str(resolve_path(input_path, root_dir))
     else:
-        if merge_jsonl:
-            merged_ready = merge_output.exists()
-            if merged_ready:
-                input_abs = str(merge_output)
-            else:
-                input_abs = ""
-        else:
-            input_abs = ""
         try:
-            if not input_abs:
-                input_file_path = expand_input_pattern(
-                    input_path,
-                    root_dir,
-                    merge_files=merge_jsonl,
-                    merge_output=merge_output,
-                    required_json_keys=required_keys,
-                    shuffle=shuffle_jsonl,
-                    shuffle_seed=int(shuffle_seed) if shuffle_seed else None,
-                    shuffle_buffer=shuffle_buffer,
-                )
-                input_abs = str(resolve_path(str(input_file_path), root_dir))
+            # Re-merges only when the raw inputs changed (merged_input.jsonl.sources.json)
+            input_file_path = expand_input_pattern(
+                input_path,
+                root_dir,
+                merge_files=merge_jsonl,
+                merge_output=merge_output,
+                required_json_keys=required_keys,
+                shuffle=shuffle_jsonl,
+                shuffle_seed=int(shuffle_seed) if shuffle_seed else None,
+                shuffle_buffer=shuffle_buffer,
+                shuffle_mode=shuffle_mode,
+                workers=workers,
+            )
+            input_abs = str(resolve_path(str(input_file_path), root_dir))
         except (FileNotFoundError, ValueError) as e:
             print(f"tokenize_cpt: {e}", file=sys.stderr)
             # Check if CPT_RAW_COPY_SRC is configured
@@ -186,6 +195,7 @@ def main() -> int:
     print(f"tokenize_cpt: preprocess_script={preprocess_script_abs}")
     print(f"tokenize_cpt: input={input_abs}")
     print(f"tokenize_cpt: output_prefix={output_prefix_abs}")
+    print(f"tokenize_cpt: partitions={partitions} workers={workers}")
     print(f"tokenize_cpt: tokenizer_path={tokenizer_path_abs}")
     if tokenizer_vocab_file:
         print(f"tokenize_cpt: tokenizer_vocab_file={tokenizer_vocab_file_abs}")
@@ -198,12 +208,39 @@ def main() -> int:
         print(f"[dry-run] tokenize_cpt: (cd {preprocess_workdir_abs} && {' '.join(cmd)})")
         return 0
     
+    # Skip preprocess_data.py when inputs, tokenizer and params match the last successful run
+    output_json_keys = json_keys.split()
+    cache_key = None
+    if tokenize_cache:
+        cache_key = tokenize_cache_key(
+            [Path(input_abs)],
+            tokenizer_path_abs,
+            {
+                "json_keys": " ".join(output_json_keys),
+                "tokenizer_type": tokenizer_type,
+                "tokenizer_vocab_file": str(tokenizer_vocab_file or ""),
+                "workers": str(workers),
+                "partitions": str(partitions),
+                "append_eod": "1",
+            },
+            max_workers=workers,
+        )
+        if tokenize_cache_hit(output_prefix_abs, output_json_keys, cache_key):
+            print(f"tokenize_cpt: cache.hit key={cache_key[:16]} output_prefix={output_prefix_abs}")
+            preload_tokenized_outputs(output_prefix_abs, output_json_keys, workers, preload_bin)
+            return 0
+        print(f"tokenize_cpt: cache.miss key={cache_key[:16]}")
+        clear_tokenize_cache_key(output_prefix_abs)
+
     try:
         subprocess.run(cmd, cwd=preprocess_workdir_abs, check=True)
     except subprocess.CalledProcessError as e:
         print(f"tokenize_cpt: failed with exit code {e.returncode}", file=sys.stderr)
         return e.returncode
-    
+
+    if cache_key:
+        write_tokenize_cache_key(output_prefix_abs, cache_key)
+    preload_tokenized_outputs(output_prefix_abs, output_json_keys, workers, preload_bin)
     return 0
 
 
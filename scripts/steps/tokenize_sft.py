@@ -13,7 +13,17 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent.parent / "utils"))
 from config import load_config_module, merge_env_defaults, resolve_config_vars, require_config, require_path_exists
 from step_utils import apply_pipeline_context, resolve_path, run_extern_script
-from tokenize_utils import expand_input_pattern, rewrite_sft_jsonl_to_input_label
+from tokenize_utils import (
+    SFT_REWRITE_OUTPUT_NAME,
+    clear_tokenize_cache_key,
+    expand_input_pattern,
+    preload_tokenized_outputs,
+    resolve_partitions,
+    rewrite_sft_jsonl_to_input_label,
+    tokenize_cache_hit,
+    tokenize_cache_key,
+    write_tokenize_cache_key,
+)
 
 
 def main() -> int:
@@ -84,7 +94,11 @@ def main() -> int:
     
     # Optional config with defaults
     workers = int(config.get("WORKERS", "16"))
-    partitions = int(config.get("PARTITIONS", "16"))
+    partitions, workers = resolve_partitions(
+        str(config.get("PARTITIONS", "16")),
+        workers,
+        int(config.get("WORKERS_PER_PARTITION", "16")),
+    )
     log_interval = int(config.get("LOG_INTERVAL", "100000"))
     json_keys = config.get("JSON_KEYS") or config.get("SFT_JSON_KEYS", "instruction input output")
     tokenizer_type = config.get("TOKENIZER_TYPE", "HuggingFaceTokenizer")
@@ -93,6 +107,9 @@ def main() -> int:
     shuffle_jsonl = str(config.get("SHUFFLE_JSONL", "0")) == "1"
     shuffle_seed = config.get("SHUFFLE_SEED")
     shuffle_buffer = int(config.get("SHUFFLE_BUFFER", "10000"))
+    shuffle_mode = str(config.get("SHUFFLE_MODE", "block")).strip().lower()
+    tokenize_cache = str(config.get("TOKENIZE_CACHE", "1")) == "1"
+    preload_bin = str(config.get("PRELOAD_BIN", "0"))
     
     print("tokenize_sft: starting")
     
@@ -118,27 +135,29 @@ def main() -> int:
     if dry_run:
         input_abs = str(resolve_path(input_path, root_dir))
     else:
-        if merge_jsonl:
-            merged_ready = merge_output.exists()
-            if merged_ready:
-                input_abs = str(merge_output)
-            else:
-                input_abs = ""
-        else:
-            input_abs = ""
+        # The input/label rewrite may sit in the raw dir too; it is not a raw input
+        rewrite_exclude = []
+        if rewrite_input_label:
+            rewrite_output = config.get("REWRITE_OUTPUT_FILE")
+            rewrite_exclude.append(
+                resolve_path(rewrite_output, root_dir) if rewrite_output else merge_output.parent / SFT_REWRITE_OUTPUT_NAME
+            )
         try:
-            if not input_abs:
-                input_file_path = expand_input_pattern(
-                    input_path,
-                    root_dir,
-                    merge_files=merge_jsonl,
-                    merge_output=merge_output,
-                    required_json_keys=required_keys,
-                    shuffle=shuffle_jsonl,
-                    shuffle_seed=int(shuffle_seed) if shuffle_seed else None,
-                    shuffle_buffer=shuffle_buffer,
-                )
-                input_abs = str(resolve_path(str(input_file_path), root_dir))
+            # Re-merges only when the raw inputs changed (merged_input.jsonl.sources.json)
+            input_file_path = expand_input_pattern(
+                input_path,
+                root_dir,
+                merge_files=merge_jsonl,
+                merge_output=merge_output,
+                required_json_keys=required_keys,
+                shuffle=shuffle_jsonl,
+                shuffle_seed=int(shuffle_seed) if shuffle_seed else None,
+                shuffle_buffer=shuffle_buffer,
+                shuffle_mode=shuffle_mode,
+                workers=workers,
+                exclude=rewrite_exclude,
+            )
+            input_abs = str(resolve_path(str(input_file_path), root_dir))
         except (FileNotFoundError, ValueError) as e:
             print(f"tokenize_sft: {e}", file=sys.stderr)
             # Check if SFT_RAW_COPY_SRC is configured
@@ -158,16 +177,12 @@ def main() -> int:
         if rewrite_output:
             rewrite_output_abs = resolve_path(rewrite_output, root_dir)
         else:
-            rewrite_output_abs = Path(input_abs).parent / "sft_input_label.jsonl"
+            rewrite_output_abs = Path(input_abs).parent / SFT_REWRITE_OUTPUT_NAME
         print(f"tokenize_sft: rewriting input/label -> {rewrite_output_abs}")
-        if not dry_run:
-            rewrite_sft_jsonl_to_input_label(
-                Path(input_abs),
-                rewrite_output_abs,
-                prompt_template,
-                input_template,
-                response_prefix,
-            )
+    # The tokenize cache key is taken from the pre-rewrite input (plus the rewrite
+    # parameters), so a cache hit skips the rewrite as well as preprocess_data.py
+    source_abs = input_abs
+    if rewrite_input_label:
         input_abs = str(rewrite_output_abs)
     
     # Validate paths are under datapool (unless allowed)
@@ -227,6 +242,7 @@ def main() -> int:
     print(f"tokenize_sft: preprocess_script={preprocess_script_abs}")
     print(f"tokenize_sft: input={input_abs}")
     print(f"tokenize_sft: output_prefix={output_prefix_abs}")
+    print(f"tokenize_sft: partitions={partitions} workers={workers}")
     print(f"tokenize_sft: json_keys={json_keys}")
     
     # Create output directory
@@ -237,12 +253,57 @@ def main() -> int:
         print(f"[dry-run] tokenize_sft: (cd {preprocess_workdir_abs} && {' '.join(cmd)})")
         return 0
     
+    # Skip preprocess_data.py when inputs, tokenizer and params match the last successful run
+    output_json_keys = (json_keys.split() if isinstance(json_keys, str) else list(json_keys))
+    cache_key = None
+    if tokenize_cache:
+        cache_params = {
+            "json_keys": " ".join(output_json_keys),
+            "tokenizer_type": tokenizer_type,
+            "tokenizer_vocab_file": str(tokenizer_vocab_file or ""),
+            "workers": str(workers),
+            "partitions": str(partitions),
+            "append_eod": "1",
+        }
+        if rewrite_input_label:
+            cache_params.update(
+                rewrite_input_label="1",
+                prompt_template=prompt_template,
+                prompt_input_template=input_template,
+                prompt_response_prefix=response_prefix,
+            )
+        cache_key = tokenize_cache_key(
+            [Path(source_abs)],
+            tokenizer_path_abs,
+            cache_params,
+            max_workers=workers,
+        )
+        if tokenize_cache_hit(output_prefix_abs, output_json_keys, cache_key):
+            print(f"tokenize_sft: cache.hit key={cache_key[:16]} output_prefix={output_prefix_abs}")
+            preload_tokenized_outputs(output_prefix_abs, output_json_keys, workers, preload_bin)
+            return 0
+        print(f"tokenize_sft: cache.miss key={cache_key[:16]}")
+        clear_tokenize_cache_key(output_prefix_abs)
+
+    if rewrite_input_label:
+        rewrite_sft_jsonl_to_input_label(
+            Path(source_abs),
+            rewrite_output_abs,
+            prompt_template,
+            input_template,
+            response_prefix,
+            workers=workers,
+        )
+
     try:
         subprocess.run(cmd, cwd=preprocess_workdir_abs, check=True)
     except subprocess.CalledProcessError as e:
         print(f"tokenize_sft: failed with exit code {e.returncode}", file=sys.stderr)
         return e.returncode
-    
+
+    if cache_key:
+        write_tokenize_cache_key(output_prefix_abs, cache_key)
+    preload_tokenized_outputs(output_prefix_abs, output_json_keys, workers, preload_bin)
     return 0
 
 
@@ -5,6 +5,7 @@ Step 7: SFT training
 from __future__ import annotations
 
 import os
+import shlex
 import subprocess
 import sys
 from pathlib import Path
@@ -12,7 +13,15 @@ from pathlib import Path
 # Add utils to path
 sys.path.insert(0, str(Path(__file__).parent.parent / "utils"))
 from config import load_config_module, resolve_config_vars, require_config, require_path_exists
-from step_utils import apply_pipeline_context, run_extern_script
+from step_utils import (
+    apply_pipeline_context,
+    build_train_argv,
+    read_launch_record,
+    run_extern_script,
+    train_input_paths,
+    train_launch_key,
+    write_launch_record,
+)
 
 
 def main() -> int:
@@ -29,6 +38,8 @@ def main() -> int:
 
     # Load and resolve config
     config = load_config_module(step_env_path)
+    # TRAIN_ARGS is a list; keep it before resolve_config_vars stringifies values
+    raw_train_args = config.get("TRAIN_ARGS")
     context = {
         "DATAPOOL_ROOT": str(datapool_root),
         "ROOT_DIR": str(root_dir),
@@ -55,8 +66,12 @@ def main() -> int:
 
     # Extract required config
     run_with = config.get("RUN_WITH")
-    if run_with not in ("cmd", "entrypoint"):
-        print("train_sft: set RUN_WITH=cmd (and TRAIN_CMD) or RUN_WITH=entrypoint (and ENTRYPOINT, ARGS) in step config", file=sys.stderr)
+    if run_with not in ("cmd", "entrypoint", "argv"):
+        print(
+            "train_sft: set RUN_WITH=cmd (and TRAIN_CMD), RUN_WITH=argv (and TRAIN_ENTRY, TRAIN_ARGS) "
+            "or RUN_WITH=entrypoint (and ENTRYPOINT, ARGS) in step config",
+            file=sys.stderr,
+        )
         return 2
 
     # MEGATRON or MINDSPEED
@@ -80,6 +95,16 @@ def main() -> int:
         for key, value in config.items():
             if isinstance(value, str):
                 train_cmd = train_cmd.replace(f"${{{key}}}", value)
+    elif run_with == "argv":
+        train_entry = require_config(config, "TRAIN_ENTRY", "train_sft")
+        if not isinstance(raw_train_args, (list, tuple)):
+            print("train_sft: RUN_WITH=argv requires TRAIN_ARGS (list) in step config", file=sys.stderr)
+            return 2
+        try:
+            train_argv = build_train_argv(config.get("TRAIN_LAUNCHER", ""), train_entry, raw_train_args, config)
+        except ValueError as e:
+            print(f"train_sft: TRAIN_LAUNCHER/TRAIN_ARGS: {e}", file=sys.stderr)
+            return 2
     else:  # entrypoint
         entrypoint = require_config(config, "ENTRYPOINT", "train_sft")
         args = config.get("ARGS", "")
@@ -90,6 +115,8 @@ def main() -> int:
         if run_with == "cmd":
             if train_cmd:
                 print(f"[dry-run] (cd {trainer_dir} && {train_cmd})")
+        elif run_with == "argv":
+            print(f"[dry-run] (cd {trainer_dir} && {shlex.join(train_argv)})")
         else:
             print(f"[dry-run] (cd {trainer_dir} && python {entrypoint} {args})")
         return 0
@@ -110,6 +137,33 @@ def main() -> int:
             return_code = proc.wait()
             if return_code != 0:
                 raise subprocess.CalledProcessError(return_code, train_cmd)
+        elif run_with == "argv":
+            # No shell: argv is exact, hashable and recorded in SAVE_DIR/launch.json
+            save_dir = Path(config["SAVE_DIR"]) if config.get("SAVE_DIR") else None
+            launch_key = train_launch_key(train_argv, trainer_dir, env, train_input_paths(config))
+            train_cache = str(config.get("TRAIN_CACHE", "1")) == "1"
+            if save_dir is not None and train_cache:
+                record = read_launch_record(save_dir)
+                if record and record.get("key") == launch_key and record.get("status") == "success":
+                    print(f"train_sft: cache.hit key={launch_key[:16]} save_dir={save_dir} (set TRAIN_CACHE=0 to retrain)")
+                    return 0
+                print(f"train_sft: cache.miss key={launch_key[:16]}")
+            record = {"argv": train_argv, "cwd": str(trainer_dir), "key": launch_key, "status": "running"}
+            if save_dir is not None:
+                write_launch_record(save_dir, record)
+            proc = subprocess.Popen(
+                train_argv,
+                cwd=trainer_dir,
+                env=env,
+                stdout=sys.stdout,
+                stderr=sys.stderr,
+                bufsize=0,  # Unbuffered
+            )
+            return_code = proc.wait()
+            if save_dir is not None:
+                write_launch_record(save_dir, dict(record, status="success" if return_code == 0 else "failed"))
+            if return_code != 0:
+                raise subprocess.CalledProcessError(return_code, train_argv)
         else:
             cmd = ["python", "-u", entrypoint]  # -u for unbuffered output
             if args:
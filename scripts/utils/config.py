@@ -5,34 +5,22 @@ Replaces .env file parsing with Python config modules.
 """
 from __future__ import annotations
 
+import copy
 import importlib.util
+import re
 import sys
+from functools import lru_cache
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, Iterable, List
 
 
-def load_config_module(config_path: Path, _visited: set[Path] | None = None) -> Dict[str, Any]:
+@lru_cache(maxsize=None)
+def _exec_config_file(config_path: Path, mtime_ns: int, size: int) -> Dict[str, Any]:
     """
-    Load a Python config file as a module and return its variables.
-    
-    The config file should define variables directly (not in a dict).
-    Example:
-        INPUT_DATA_PATH = "${DATAPOOL_ROOT}/data/raw/cpt"
-        WORKERS = 32
-        INCLUDE = "../../common/steps/tokenize_cpt_megatron.py"
-    
-    Variables are returned as a dict with string values (for compatibility
-    with existing code that expects env-like dicts).
+    Execute one config file and return its public variables (INCLUDE not expanded).
+    Cached by (path, mtime, size): a template INCLUDEd by several step configs
+    is only read and executed once per process, and an edited file is re-read.
     """
-    if _visited is None:
-        _visited = set()
-    config_path = config_path.resolve()
-    if config_path in _visited:
-        raise ValueError(f"Recursive INCLUDE detected: {config_path}")
-    _visited.add(config_path)
-    if not config_path.exists():
-        raise FileNotFoundError(f"Config file not found: {config_path}")
-    
     spec = importlib.util.spec_from_file_location("config", config_path)
     if spec is None or spec.loader is None:
         raise ValueError(f"Could not load config from: {config_path}")
@@ -58,6 +46,35 @@ def load_config_module(config_path: Path, _visited: set[Path] | None = None) ->
             config[name] = str(value)
         else:
             config[name] = value
+    return config
+
+
+def load_config_module(config_path: Path, _visited: set[Path] | None = None) -> Dict[str, Any]:
+    """
+    Load a Python config file as a module and return its variables.
+    
+    The config file should define variables directly (not in a dict).
+    Example:
+        INPUT_DATA_PATH = "${DATAPOOL_ROOT}/data/raw/cpt"
+        WORKERS = 32
+        INCLUDE = "../../common/steps/tokenize_cpt_megatron.py"
+    
+    Variables are returned as a dict with string values (for compatibility
+    with existing code that expects env-like dicts).
+    """
+    if _visited is None:
+        _visited = set()
+    config_path = config_path.resolve()
+    if config_path in _visited:
+        raise ValueError(f"Recursive INCLUDE detected: {config_path}")
+    _visited.add(config_path)
+    if not config_path.exists():
+        raise FileNotFoundError(f"Config file not found: {config_path}")
+    
+    st = config_path.stat()
+    cached = _exec_config_file(config_path, st.st_mtime_ns, st.st_size)
+    # Callers may mutate the result; only non-str values (lists/dicts) need a deep copy.
+    config = {k: (v if isinstance(v, str) else copy.deepcopy(v)) for k, v in cached.items()}
 
     include_value = config.pop("INCLUDE", None) or config.pop("INCLUDES", None)
     if include_value:
@@ -77,47 +94,84 @@ def load_config_module(config_path: Path, _visited: set[Path] | None = None) ->
     return config
 
 
-def resolve_config_vars(config: Dict[str, Any], context: Dict[str, str]) -> Dict[str, str]:
+def config_file_deps(config_path: Path, _visited: set[Path] | None = None) -> List[Path]:
+    """
+    Return config_path and every file it INCLUDEs (recursively), i.e. the
+    files whose edits change what load_config_module returns for it.
+    """
+    if _visited is None:
+        _visited = set()
+    config_path = config_path.resolve()
+    if config_path in _visited or not config_path.exists():
+        return []
+    _visited.add(config_path)
+    st = config_path.stat()
+    cached = _exec_config_file(config_path, st.st_mtime_ns, st.st_size)
+    deps = [config_path]
+    include_value = cached.get("INCLUDE") or cached.get("INCLUDES")
+    if include_value:
+        includes = [include_value] if isinstance(include_value, (str, Path)) else list(include_value)
+        for inc in includes:
+            inc_path = Path(inc)
+            if not inc_path.is_absolute():
+                inc_path = config_path.parent / inc_path
+            deps.extend(config_file_deps(inc_path, _visited))
+    return deps
+
+
+_VAR_RE = re.compile(r"\$\{(\w+)\}")
+
+
+def resolve_config_vars(
+    config: Dict[str, Any],
+    context: Dict[str, str],
+    keys: Iterable[str] | None = None,
+) -> Dict[str, str]:
     """
     Resolve ${VAR} substitutions in config values using context.
+    With keys, only those entries (and the values they reference) are resolved
+    and returned.
     
     Supports nested variable resolution (e.g., ${VAR1}/${VAR2}).
-    Resolves in multiple passes to handle dependencies.
+    Each value is scanned once with a compiled regex; referenced config
+    values are resolved on demand and memoized. Context wins over config
+    values of the same name, a key never expands itself, and unknown or
+    cyclic references are left as-is.
     
     Example:
         config = {"INPUT_DATA_PATH": "${DATAPOOL_ROOT}/data/raw"}
         context = {"DATAPOOL_ROOT": "/path/to/datapool"}
         result = {"INPUT_DATA_PATH": "/path/to/datapool/data/raw"}
     """
+    raw: Dict[str, str] = {k: (v if isinstance(v, str) else str(v)) for k, v in config.items()}
     resolved: Dict[str, str] = {}
-    # First pass: copy all values
-    for key, value in config.items():
-        if isinstance(value, str):
-            resolved[key] = value
-        else:
-            resolved[key] = str(value)
-    
-    # Multiple passes for nested variable resolution
-    max_passes = 10
-    for _ in range(max_passes):
-        changed = False
-        for key, value in resolved.items():
-            if isinstance(value, str) and "${" in value:
-                new_value = value
-                for var_name, var_value in context.items():
-                    if f"${{{var_name}}}" in new_value:
-                        new_value = new_value.replace(f"${{{var_name}}}", var_value)
-                        changed = True
-                # Also resolve from already-resolved config values
-                for var_name, var_value in resolved.items():
-                    if var_name != key and f"${{{var_name}}}" in new_value:
-                        new_value = new_value.replace(f"${{{var_name}}}", var_value)
-                        changed = True
-                resolved[key] = new_value
-        if not changed:
-            break
-    
-    return resolved
+
+    def expand(text: str, keys: frozenset, ctx_names: frozenset) -> str:
+        if "${" not in text:
+            return text
+
+        def sub(m: re.Match) -> str:
+            name = m.group(1)
+            if name in context:
+                if name in ctx_names:
+                    return m.group(0)
+                return expand(context[name], keys, ctx_names | {name})
+            if name in raw and name not in keys:
+                return resolve_key(name, keys)
+            return m.group(0)
+
+        return _VAR_RE.sub(sub, text)
+
+    def resolve_key(key: str, keys: frozenset = frozenset()) -> str:
+        if key in resolved:
+            return resolved[key]
+        value = expand(raw[key], keys | {key}, frozenset())
+        resolved[key] = value
+        return value
+
+    if keys is not None:
+        return {key: resolve_key(key) for key in keys if key in raw}
+    return {key: resolve_key(key) for key in raw}
 
 
 ENV_IMPORT_KEYS = [
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Step instance dependency graph.
+
+Each step instance may declare depends_on (list of instance ids). The graph is
+split into generations with Kahn's algorithm: every instance in a generation
+only depends on instances from earlier generations, so one generation can run
+concurrently.
+"""
+from __future__ import annotations
+
+import json
+import statistics
+from pathlib import Path
+from typing import Any, Dict, List, Sequence, Tuple
+
+
+def build_generations(instances: Sequence[Any]) -> List[List[Any]]:
+    """
+    Group step instances into topological generations.
+
+    instances: objects with .instance_id and .depends_on (ids), in STEPS order.
+    Generation members keep STEPS order. Raises SystemExit on unknown
+    dependency ids or dependency cycles.
+    """
+    by_id: Dict[str, Any] = {inst.instance_id: inst for inst in instances}
+    indegree: Dict[str, int] = {inst.instance_id: 0 for inst in instances}
+    consumers: Dict[str, List[str]] = {inst.instance_id: [] for inst in instances}
+
+    for inst in instances:
+        for dep in inst.depends_on:
+            if dep not in by_id:
+                raise SystemExit(
+                    f"Invalid depends_on for {inst.instance_id!r}: unknown step instance id {dep!r}"
+                )
+            if dep == inst.instance_id:
+                raise SystemExit(f"Invalid depends_on for {inst.instance_id!r}: depends on itself")
+            indegree[inst.instance_id] += 1
+            consumers[dep].append(inst.instance_id)
+
+    order = {inst.instance_id: idx for idx, inst in enumerate(instances)}
+    generations: List[List[Any]] = []
+    ready = [iid for iid, deg in indegree.items() if deg == 0]
+    scheduled = 0
+    while ready:
+        ready.sort(key=order.__getitem__)
+        generations.append([by_id[iid] for iid in ready])
+        scheduled += len(ready)
+        next_ready: List[str] = []
+        for iid in ready:
+            for consumer in consumers[iid]:
+                indegree[consumer] -= 1
+                if indegree[consumer] == 0:
+                    next_ready.append(consumer)
+        ready = next_ready
+
+    if scheduled != len(instances):
+        cyclic = sorted((iid for iid, deg in indegree.items() if deg > 0), key=order.__getitem__)
+        raise SystemExit(f"Dependency cycle detected in STEPS depends_on: {cyclic}")
+    return generations
+
+
+def format_plan(generations: Sequence[Sequence[Any]]) -> List[str]:
+    """Render generations as readable lines: 'gen[i]: id(type) <- deps'."""
+    lines: List[str] = []
+    for gen_index, generation in enumerate(generations):
+        for inst in generation:
+            deps = ", ".join(inst.depends_on) if inst.depends_on else "-"
+            lines.append(f"gen[{gen_index}] {inst.instance_id} ({inst.step_type}) <- {deps}")
+    return lines
+
+
+def to_dot(instances: Sequence[Any]) -> str:
+    """Render the step graph in Graphviz dot format (dot -Tpng dag.dot -o dag.png)."""
+    lines = ["digraph pipeline {", "  rankdir=LR;"]
+    for inst in instances:
+        lines.append(f'  "{inst.instance_id}" [label="{inst.instance_id}\\n{inst.step_type}"];')
+    for inst in instances:
+        for dep in inst.depends_on:
+            lines.append(f'  "{dep}" -> "{inst.instance_id}";')
+    lines.append("}")
+    return "\n".join(lines) + "\n"
+
+
+# Static priority for step types without recorded timings (higher runs first).
+_STATIC_PRIORITY = (("train_", 4), ("tokenize_", 3), ("mg2hf", 2), ("hf2mg", 1))
+
+
+def _static_priority(step_type: str) -> int:
+    for prefix, rank in _STATIC_PRIORITY:
+        if step_type.startswith(prefix):
+            return rank
+    return 0
+
+
+def append_step_timing(timings_path: Path, record: Dict[str, Any]) -> None:
+    """Append one timing record as a json line (single write, safe across step threads)."""
+    timings_path.parent.mkdir(parents=True, exist_ok=True)
+    line = json.dumps(record, ensure_ascii=False, sort_keys=True) + "\n"
+    with timings_path.open("a", encoding="utf-8") as f:
+        f.write(line)
+
+
+def load_step_weights(timings_path: Path, last_n: int = 5) -> Dict[str, float]:
+    """
+    Vertex weights for scheduling: median duration (s) of the last last_n
+    recorded runs per step type, from step_timings.jsonl.
+    """
+    if not timings_path.exists():
+        return {}
+    durations: Dict[str, List[float]] = {}
+    with timings_path.open("r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+                durations.setdefault(str(rec["type"]), []).append(float(rec["end_ts"]) - float(rec["start_ts"]))
+            except (ValueError, KeyError, TypeError):
+                continue
+    return {t: statistics.median(d[-last_n:]) for t, d in durations.items() if d}
+
+
+def order_by_cost(generation: Sequence[Any], weights: Dict[str, float]) -> List[Any]:
+    """
+    Longest-expected-first order for a generation that has more ready steps
+    than parallel slots. Types never timed go first, ranked train_* >
+    tokenize_* > mg2hf > hf2mg > others; timed types follow by median
+    duration, descending. Ties keep STEPS order.
+    """
+    def key(inst: Any) -> Tuple[int, float]:
+        weight = weights.get(inst.step_type)
+        if weight is None:
+            return (0, -_static_priority(inst.step_type))
+        return (1, -weight)
+
+    return sorted(generation, key=key)
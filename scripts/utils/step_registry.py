@@ -38,12 +38,21 @@ def _output_dir_from_dir(config: Dict[str, Any], *keys: str, default: Optional[P
     return default
 
 
+def _tokenize_cache_enabled(config: Dict[str, Any]) -> bool:
+    return str(config.get("TOKENIZE_CACHE", "1")) == "1"
+
+
 # Per-step output-dir logic for clearing before run. Returns None if step has no clearable output.
+# Tokenize steps with TOKENIZE_CACHE=1 manage their own outputs (<prefix>.cachekey + bin/idx).
 def _get_output_dir_tokenize_cpt(config: Dict[str, Any], datapool_root: Path) -> Optional[Path]:
+    if _tokenize_cache_enabled(config):
+        return None
     return _output_dir_from_prefix(config, "OUTPUT_PREFIX")
 
 
 def _get_output_dir_tokenize_sft(config: Dict[str, Any], datapool_root: Path) -> Optional[Path]:
+    if _tokenize_cache_enabled(config):
+        return None
     return _output_dir_from_prefix(config, "OUTPUT_PREFIX") or _output_dir_from_prefix(config, "SFT_OUTPUT_PREFIX")
 
 
@@ -67,6 +76,20 @@ _OUTPUT_DIR_GETTERS: Dict[str, Optional[Callable[[Dict[str, Any], Path], Optiona
 }
 
 
+# Step type -> resource group. run.py never schedules two steps of the same group
+# in the same wave, even when the DAG would allow it; a step waiting on its group
+# stays deferred and does not hold a MAX_PARALLEL_STEPS slot.
+_RESOURCE_GROUPS: Dict[str, Optional[str]] = {
+    "tokenize_cpt": None,
+    "tokenize_sft": None,
+    "train_cpt": "gpu",
+    "mg2hf": None,
+    "hf2mg": None,
+    "train_sft": "gpu",
+    "eval": "gpu",
+}
+
+
 class Step:
     """
     One step type in the pipeline. Script and config: scripts/steps/<name>.py,
@@ -82,6 +105,11 @@ class Step:
     def script_name(self) -> str:
         return f"{self.name}.py"
 
+    @property
+    def resource_group(self) -> Optional[str]:
+        """Exclusive resource this step type needs (e.g. "gpu"), or None."""
+        return _RESOURCE_GROUPS.get(self.name)
+
     def script_path(self, root_dir: Path) -> Path:
         return root_dir / "scripts" / "steps" / self.script_name
 
@@ -104,6 +132,9 @@ class Step:
         getter = _OUTPUT_DIR_GETTERS.get(self.name)
         if getter is None:
             return None
+        # CLEAR_OUTPUT_DIR=0 in the step config keeps existing outputs (append-mode runs).
+        if str(config.get("CLEAR_OUTPUT_DIR", "1")) == "0":
+            return None
         try:
             return getter(config, datapool_root)
         except Exception:
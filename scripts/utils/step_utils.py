@@ -1,13 +1,18 @@
 #!/usr/bin/env python3
 from __future__ import annotations
 
+import hashlib
+import json
 import os
+import re
+import shlex
 import subprocess
 import sys
+import time
 from pathlib import Path
-from typing import Any, Optional
+from typing import Any, Iterable, List, Optional
 
-from config import apply_env_imports
+from config import _VAR_RE, apply_env_imports
 
 PIPELINE_CONTEXT_KEYS = [
     "BASE_MODEL_NAME",
@@ -18,8 +23,13 @@ PIPELINE_CONTEXT_KEYS = [
     "MODEL_PREFIX",
     "MEGATRON",
     "MINDSPEED",
+    "HANDOFF_DIR",
 ]
 
+# Env var prefixes that change training behavior and therefore the launch key
+TRAIN_KEY_ENV_PREFIXES = ("CUDA_", "NCCL_", "TORCH_", "PYTORCH_")
+LAUNCH_RECORD_NAME = "launch.json"
+
 
 def run_extern_script(
     config: dict[str, Any],
@@ -64,3 +74,97 @@ def resolve_path(path_str: str, root_dir: Path) -> Path:
     if path.is_absolute():
         return path.resolve()
     return (root_dir / path).resolve()
+
+
+def expand_config_vars(value: str, config: dict[str, Any]) -> str:
+    """
+    Replace ${KEY} in value with resolved config values (one regex pass).
+    Raises ValueError on a ${KEY} the config does not define: argv is run
+    without a shell, so a leftover placeholder would reach the trainer as is.
+    """
+    if "${" not in value:
+        return value
+
+    def sub(m: re.Match) -> str:
+        name = m.group(1)
+        if name not in config:
+            raise ValueError(f"unresolved ${{{name}}} in {value!r}")
+        return str(config[name])
+
+    return _VAR_RE.sub(sub, value)
+
+
+def build_train_argv(launcher: str, entry: str, train_args: Iterable[Any], config: dict[str, Any]) -> List[str]:
+    """
+    Build the training argv (no shell) from TRAIN_LAUNCHER + TRAIN_ENTRY + TRAIN_ARGS.
+
+    TRAIN_ARGS items: ("flag", value) -> --flag value; ("flag", None) or "flag" -> --flag.
+    Values are ${VAR}-expanded against the resolved step config; an unknown
+    ${VAR} raises ValueError.
+    """
+    argv = [expand_config_vars(x, config) for x in shlex.split(launcher)] if launcher else []
+    argv.append(expand_config_vars(entry, config))
+    for item in train_args:
+        if isinstance(item, str):
+            name, value = item, None
+        else:
+            name, value = (tuple(item) + (None,))[:2]
+        name = str(name)
+        argv.append(name if name.startswith("-") else f"--{name}")
+        if value is not None:
+            argv.append(expand_config_vars(str(value), config))
+    return argv
+
+
+def _fingerprint(path: Path) -> str:
+    try:
+        st = path.stat()
+    except OSError:
+        return f"{path}:missing"
+    return f"{path}:{st.st_size}:{st.st_mtime_ns}"
+
+
+def train_launch_key(argv: List[str], cwd: Path, env: dict[str, str], input_paths: Iterable[Path]) -> str:
+    """Hash of argv, cwd, training-relevant env and input file fingerprints."""
+    h = hashlib.sha256()
+    h.update(json.dumps(argv).encode("utf-8"))
+    h.update(str(cwd).encode("utf-8"))
+    for key in sorted(env):
+        if key.startswith(TRAIN_KEY_ENV_PREFIXES):
+            h.update(f"{key}={env[key]}\n".encode("utf-8"))
+    for path in input_paths:
+        h.update(_fingerprint(path).encode("utf-8"))
+    return h.hexdigest()
+
+
+def train_input_paths(config: dict[str, Any]) -> List[Path]:
+    """Files whose change must invalidate a cached training run (data bin/idx, loaded checkpoint)."""
+    paths: List[Path] = []
+    for token in str(config.get("DATA_PATH") or "").split():
+        try:
+            float(token)  # blend weight in "w1 prefix1 w2 prefix2"
+            continue
+        except ValueError:
+            paths.extend([Path(token + ".bin"), Path(token + ".idx")])
+    load_dir = config.get("LOAD_DIR")
+    if load_dir:
+        paths.append(Path(load_dir) / "latest_checkpointed_iteration.txt")
+    return paths
+
+
+def read_launch_record(save_dir: Path) -> Optional[dict[str, Any]]:
+    path = save_dir / LAUNCH_RECORD_NAME
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def write_launch_record(save_dir: Path, record: dict[str, Any]) -> None:
+    """Write <SAVE_DIR>/launch.json atomically (expanded argv, key, status)."""
+    save_dir.mkdir(parents=True, exist_ok=True)
+    path = save_dir / LAUNCH_RECORD_NAME
+    tmp = path.with_name(path.name + ".tmp")
+    record = dict(record, updated_at=time.strftime("%F %T"))
+    tmp.write_text(json.dumps(record, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+    os.replace(tmp, path)
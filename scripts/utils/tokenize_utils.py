@@ -4,13 +4,208 @@ Utilities for tokenization steps, including JSONL merging.
 """
 from __future__ import annotations
 
+import hashlib
+import mmap
+import multiprocessing
+import os
 import random
+import re
 import shutil
 import sys
+import time
+from array import array
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from itertools import islice
 from pathlib import Path
-from typing import List, Tuple
+from typing import Dict, Iterator, List, Tuple
 import json
 
+HASH_BLOCK_SIZE = 4 << 20
+MERGE_CHUNK_SIZE = 16 << 20
+PRELOAD_CHUNK_SIZE = 8 << 20
+# Write buffer for merged/rewritten jsonl outputs (default 8 KiB means one write(2) per ~8 KiB)
+WRITE_BUFFER_SIZE = 1 << 20
+# Raw concatenation is only safe for lines that are already in their stripped
+# form: no \r (universal newlines would split there), no blank lines, and every
+# line starts/ends with a printable ASCII byte. Anything else takes the
+# line-normalizing merge. File start/end are checked separately so the pattern
+# has no anchors and can be run per chunk (1-byte overlap covers boundaries).
+_CONCAT_UNSAFE_RE = re.compile(rb"\r|\n[^\x21-\x7e]|[^\x21-\x7e\n]\n")
+
+
+def _is_edge_byte(b: int) -> bool:
+    return 0x21 <= b <= 0x7E
+
+
+def _scan_jsonl_for_concat(path: Path) -> Tuple[int, int, bool] | None:
+    """
+    Inspect a jsonl file for raw concatenation in a single pass.
+
+    Returns (size, line_count, needs_trailing_newline), or None if any line is
+    not byte-identical to its stripped form (blank/whitespace-only lines, \r,
+    leading/trailing whitespace) and the file must go through the
+    line-normalizing merge.
+    """
+    size = path.stat().st_size
+    if size == 0:
+        return (0, 0, False)
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        needs_newline = mm[size - 1] != 0x0A
+        last = size - 1 if needs_newline else size - 2
+        if last < 0 or not _is_edge_byte(mm[0]) or not _is_edge_byte(mm[last]):
+            return None
+        lines = 0
+        for off in range(0, size, MERGE_CHUNK_SIZE):
+            chunk = mm[off:off + MERGE_CHUNK_SIZE + 1]
+            if _CONCAT_UNSAFE_RE.search(chunk):
+                return None
+            lines += chunk.count(b"\n", 0, MERGE_CHUNK_SIZE)
+    if needs_newline:
+        lines += 1
+    return (size, lines, needs_newline)
+
+
+def _copy_file_at(src: Path, out_fd: int, offset: int, size: int, needs_newline: bool) -> None:
+    """
+    Copy src into out_fd at offset. Uses os.copy_file_range with explicit
+    offsets (in-kernel, no shared file position between writers); falls back
+    to mmap + pwrite when the kernel/filesystem does not support it.
+    """
+    if size:
+        with open(src, "rb") as f:
+            pos = 0
+            if hasattr(os, "copy_file_range"):
+                try:
+                    while pos < size:
+                        n = os.copy_file_range(f.fileno(), out_fd, size - pos, pos, offset + pos)
+                        if n == 0:
+                            break
+                        pos += n
+                except OSError:
+                    pass
+            if pos < size:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    while pos < size:
+                        pos += os.pwrite(out_fd, mm[pos:pos + MERGE_CHUNK_SIZE], offset + pos)
+    if needs_newline:
+        os.pwrite(out_fd, b"\n", offset + size)
+
+
+def _merge_jsonl_files_parallel(ordered_files: List[Path], output_file: Path, workers: int) -> int | None:
+    """
+    Concatenate jsonl files with one writer per file at precomputed offsets
+    (exclusive prefix sum of sizes), copying in-kernel where supported. Returns total lines, or None when any input
+    needs line normalization (caller falls back to the line-by-line merge).
+    """
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        scans = list(ex.map(_scan_jsonl_for_concat, ordered_files))
+    if any(scan is None for scan in scans):
+        return None
+    offsets: List[int] = []
+    total_size = 0
+    total_lines = 0
+    for size, lines, needs_newline in scans:
+        offsets.append(total_size)
+        total_size += size + (1 if needs_newline else 0)
+        total_lines += lines
+    if total_lines == 0:
+        return 0
+    fd = os.open(output_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        os.ftruncate(fd, total_size)
+        with ThreadPoolExecutor(max_workers=workers) as ex:
+            futures = [
+                ex.submit(_copy_file_at, path, fd, offset, size, needs_newline)
+                for path, offset, (size, _, needs_newline) in zip(ordered_files, offsets, scans)
+            ]
+            for fut in futures:
+                fut.result()
+    finally:
+        os.close(fd)
+    return total_lines
+
+
+class _FdCache:
+    """Bounded set of open read-only fds for pread (inputs may outnumber the fd limit)."""
+
+    def __init__(self, paths: List[Path], max_open: int = 256) -> None:
+        self._paths = paths
+        self._max_open = max_open
+        self._fds: "OrderedDict[int, int]" = OrderedDict()
+
+    def pread(self, file_idx: int, length: int, offset: int) -> bytes:
+        fd = self._fds.get(file_idx)
+        if fd is None:
+            if len(self._fds) >= self._max_open:
+                _, old_fd = self._fds.popitem(last=False)
+                os.close(old_fd)
+            fd = os.open(self._paths[file_idx], os.O_RDONLY)
+            self._fds[file_idx] = fd
+        else:
+            self._fds.move_to_end(file_idx)
+        return os.pread(fd, length, offset)
+
+    def close(self) -> None:
+        for fd in self._fds.values():
+            os.close(fd)
+        self._fds.clear()
+
+
+def _merge_jsonl_windowed_shuffle(
+    ordered_files: List[Path],
+    output_file: Path,
+    rng: random.Random,
+    window: int,
+) -> int:
+    """
+    Windowed shuffle merge: keep a window of `window` records as (file, offset,
+    length) triples in flat uint64 arrays; each new record evicts a random
+    window slot, which is emitted via pread. Memory is 24 bytes per slot
+    regardless of line length, so much larger windows than the line-buffer
+    shuffle are affordable. The remainder is shuffled and emitted at the end.
+    """
+    window = max(1, window)
+    file_ids = array("Q")
+    offsets = array("Q")
+    lengths = array("Q")
+    reader = _FdCache(ordered_files)
+    total_lines = 0
+    try:
+        with open(output_file, "wb", buffering=WRITE_BUFFER_SIZE) as out_f:
+
+            def emit(i: int) -> None:
+                record = reader.pread(file_ids[i], lengths[i], offsets[i]).strip()
+                out_f.write(record + b"\n")
+
+            for file_idx, input_file in enumerate(ordered_files):
+                with open(input_file, "rb") as in_f:
+                    offset = 0
+                    for line in in_f:
+                        start = offset
+                        offset += len(line)
+                        if not line.strip():  # Skip empty lines
+                            continue
+                        total_lines += 1
+                        if len(offsets) < window:
+                            file_ids.append(file_idx)
+                            offsets.append(start)
+                            lengths.append(len(line))
+                            continue
+                        i = rng.randrange(window)
+                        emit(i)
+                        file_ids[i] = file_idx
+                        offsets[i] = start
+                        lengths[i] = len(line)
+            tail = list(range(len(offsets)))
+            rng.shuffle(tail)
+            for i in tail:
+                emit(i)
+    finally:
+        reader.close()
+    return total_lines
+
 
 def merge_jsonl_files(
     input_files: List[Path],
@@ -20,6 +215,8 @@ def merge_jsonl_files(
     shuffle: bool = False,
     shuffle_seed: int | None = None,
     shuffle_buffer: int = 10000,
+    shuffle_mode: str = "block",
+    workers: int = 1,
 ) -> int:
     """
     Merge multiple JSONL files into a single JSONL file.
@@ -29,6 +226,9 @@ def merge_jsonl_files(
         input_files: List of input JSONL file paths
         output_file: Output JSONL file path
         required_keys: Ignored (kept for compatibility)
+        shuffle_mode: "block" shuffles each shuffle_buffer-line block in memory;
+            "window" streams a shuffle_buffer-record random window (offsets only)
+        workers: parallel writers for the raw concatenation used when not shuffling
         
     Returns:
         Total number of lines written
@@ -38,6 +238,8 @@ def merge_jsonl_files(
     total_lines = 0
     skipped_lines = 0
     
+    if shuffle_mode not in ("block", "window"):
+        raise ValueError(f"Invalid shuffle_mode: {shuffle_mode!r}. Use 'block' or 'window'.")
     rng = random.Random(shuffle_seed) if shuffle else None
     buffer: List[str] = []
 
@@ -50,9 +252,25 @@ def merge_jsonl_files(
         buffer.clear()
 
     ordered_files = sorted(input_files)
+    for input_file in ordered_files:
+        if not input_file.exists():
+            raise FileNotFoundError(f"Input file not found: {input_file}")
+    if rng is None and ordered_files and hasattr(os, "pwrite"):
+        parallel_lines = _merge_jsonl_files_parallel(
+            ordered_files, output_file, max(1, min(workers, len(ordered_files)))
+        )
+        if parallel_lines is not None:
+            if parallel_lines == 0:
+                raise ValueError(f"No valid lines found after merging {len(input_files)} files")
+            return parallel_lines
     if rng is not None:
         rng.shuffle(ordered_files)
-    with open(output_file, "w", encoding="utf-8") as out_f:
+    if rng is not None and shuffle_mode == "window":
+        total_lines = _merge_jsonl_windowed_shuffle(ordered_files, output_file, rng, shuffle_buffer)
+        if total_lines == 0:
+            raise ValueError(f"No valid lines found after merging {len(input_files)} files")
+        return total_lines
+    with open(output_file, "w", encoding="utf-8", buffering=WRITE_BUFFER_SIZE) as out_f:
         for input_file in ordered_files:
             if not input_file.exists():
                 raise FileNotFoundError(f"Input file not found: {input_file}")
@@ -78,95 +296,151 @@ def merge_jsonl_files(
     return total_lines
 
 
+def _to_text(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return str(value)
+
+
+def _build_input_label(
+    record: dict,
+    prompt_template: str,
+    input_template: str,
+    response_prefix: str,
+) -> Tuple[str, str] | None:
+    # Already in input/label format
+    if "input" in record and "label" in record:
+        return _to_text(record.get("input")), _to_text(record.get("label"))
+
+    # Instruction-style format
+    if "instruction" in record and "output" in record:
+        instruction = _to_text(record.get("instruction")).strip()
+        extra_input = _to_text(record.get("input")).strip()
+        prompt = prompt_template.format(instruction=instruction)
+        if extra_input:
+            prompt += input_template.format(input=extra_input)
+        prompt += response_prefix
+        return prompt, _to_text(record.get("output"))
+
+    # Prompt/response format
+    if "prompt" in record and ("response" in record or "completion" in record):
+        response = record.get("response")
+        if response is None:
+            response = record.get("completion")
+        return _to_text(record.get("prompt")), _to_text(response)
+
+    # Fallback: single text as label
+    if "text" in record:
+        return "", _to_text(record.get("text"))
+
+    return None
+
+
+def _rewrite_sft_batch(
+    batch: Tuple[str, int, List[str]],
+    prompt_template: str,
+    input_template: str,
+    response_prefix: str,
+) -> Tuple[str, int, int, List[str]]:
+    """
+    Rewrite one batch of raw lines. batch = (input_name, first_line_num, lines).
+    Returns (output_text, written, skipped, warnings).
+    """
+    input_name, first_line_num, lines = batch
+    out_lines: List[str] = []
+    warnings: List[str] = []
+    skipped = 0
+    for line_num, line in enumerate(lines, start=first_line_num):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as exc:
+            warnings.append(f"rewrite_sft_jsonl_to_input_label: invalid JSON at {input_name}:{line_num}: {exc}")
+            skipped += 1
+            continue
+        if not isinstance(record, dict):
+            warnings.append(f"rewrite_sft_jsonl_to_input_label: non-dict JSON at {input_name}:{line_num}")
+            skipped += 1
+            continue
+        pair = _build_input_label(record, prompt_template, input_template, response_prefix)
+        if not pair:
+            skipped += 1
+            continue
+        prompt, label = pair
+        if not label.strip():
+            skipped += 1
+            continue
+        text = f"{prompt}{label}"
+        out = {"input": prompt, "label": label, "text": text}
+        out_lines.append(json.dumps(out, ensure_ascii=False) + "\n")
+    return "".join(out_lines), len(out_lines), skipped, warnings
+
+
+def _iter_line_batches(input_file: Path, batch_size: int) -> Iterator[Tuple[str, int, List[str]]]:
+    with open(input_file, "r", encoding="utf-8") as in_f:
+        first_line_num = 1
+        while True:
+            lines = list(islice(in_f, batch_size))
+            if not lines:
+                return
+            yield str(input_file), first_line_num, lines
+            first_line_num += len(lines)
+
+
 def rewrite_sft_jsonl_to_input_label(
     input_file: Path,
     output_file: Path,
     prompt_template: str,
     input_template: str,
     response_prefix: str,
+    *,
+    workers: int = 1,
+    batch_size: int = 1000,
 ) -> Tuple[int, int]:
     """
     Rewrite SFT jsonl into input/label (+text) format.
 
+    With workers > 1, batches of batch_size lines are rewritten in a process
+    pool; output order matches input order.
+
     Returns:
         (written_lines, skipped_lines)
     """
     output_file.parent.mkdir(parents=True, exist_ok=True)
 
-    def to_text(value) -> str:
-        if value is None:
-            return ""
-        if isinstance(value, str):
-            return value
-        if isinstance(value, (dict, list)):
-            return json.dumps(value, ensure_ascii=False)
-        return str(value)
-
-    def build_input_label(record: dict) -> Tuple[str, str] | None:
-        # Already in input/label format
-        if "input" in record and "label" in record:
-            return to_text(record.get("input")), to_text(record.get("label"))
-
-        # Instruction-style format
-        if "instruction" in record and "output" in record:
-            instruction = to_text(record.get("instruction")).strip()
-            extra_input = to_text(record.get("input")).strip()
-            prompt = prompt_template.format(instruction=instruction)
-            if extra_input:
-                prompt += input_template.format(input=extra_input)
-            prompt += response_prefix
-            return prompt, to_text(record.get("output"))
-
-        # Prompt/response format
-        if "prompt" in record and ("response" in record or "completion" in record):
-            response = record.get("response")
-            if response is None:
-                response = record.get("completion")
-            return to_text(record.get("prompt")), to_text(response)
-
-        # Fallback: single text as label
-        if "text" in record:
-            return "", to_text(record.get("text"))
-
-        return None
-
+    rewrite = partial(
+        _rewrite_sft_batch,
+        prompt_template=prompt_template,
+        input_template=input_template,
+        response_prefix=response_prefix,
+    )
     written = 0
     skipped = 0
-    with open(input_file, "r", encoding="utf-8") as in_f, open(
-        output_file, "w", encoding="utf-8"
-    ) as out_f:
-        for line_num, line in enumerate(in_f, start=1):
-            line = line.strip()
-            if not line:
-                continue
-            try:
-                record = json.loads(line)
-            except json.JSONDecodeError as exc:
-                print(
-                    f"rewrite_sft_jsonl_to_input_label: invalid JSON at {input_file}:{line_num}: {exc}",
-                    file=sys.stderr,
-                )
-                skipped += 1
-                continue
-            if not isinstance(record, dict):
-                print(
-                    f"rewrite_sft_jsonl_to_input_label: non-dict JSON at {input_file}:{line_num}",
-                    file=sys.stderr,
-                )
-                skipped += 1
-                continue
-            pair = build_input_label(record)
-            if not pair:
-                skipped += 1
-                continue
-            prompt, label = pair
-            if not label.strip():
-                skipped += 1
-                continue
-            text = f"{prompt}{label}"
-            out = {"input": prompt, "label": label, "text": text}
-            out_f.write(json.dumps(out, ensure_ascii=False) + "\n")
-            written += 1
+    batches = _iter_line_batches(input_file, batch_size)
+    with open(output_file, "w", encoding="utf-8", buffering=WRITE_BUFFER_SIZE) as out_f:
+        if workers > 1:
+            with multiprocessing.Pool(workers) as pool:
+                results = pool.imap(rewrite, batches, chunksize=4)
+                for text, batch_written, batch_skipped, warnings in results:
+                    for msg in warnings:
+                        print(msg, file=sys.stderr)
+                    out_f.write(text)
+                    written += batch_written
+                    skipped += batch_skipped
+        else:
+            for batch in batches:
+                text, batch_written, batch_skipped, warnings = rewrite(batch)
+                for msg in warnings:
+                    print(msg, file=sys.stderr)
+                out_f.write(text)
+                written += batch_written
+                skipped += batch_skipped
 
     if skipped:
         print(
@@ -180,6 +454,38 @@ def rewrite_sft_jsonl_to_input_label(
     return written, skipped
 
 
+def _is_partition_file(name: str, names: set[str]) -> bool:
+    stem = name[: -len(".jsonl")]
+    base, sep, idx = stem.rpartition("_")
+    if not sep or not idx.isdigit():
+        return False
+    if base.endswith("_ss"):
+        base = base[: -len("_ss")]
+    return f"{base}.jsonl" in names
+
+
+# Default REWRITE_INPUT_LABEL output of tokenize_sft, written next to merged_input.jsonl
+SFT_REWRITE_OUTPUT_NAME = "sft_input_label.jsonl"
+# Sidecar next to a merged file: the sources and parameters it was built from
+MERGE_SOURCES_SUFFIX = ".sources.json"
+
+
+def _merge_sources_record(jsonl_files: List[Path], params: Dict[str, str]) -> Dict:
+    files = []
+    for p in sorted(jsonl_files):
+        st = p.stat()
+        files.append([str(p), st.st_mtime_ns, st.st_size])
+    return {"files": files, "params": params}
+
+
+def _read_merge_sources(path: Path) -> Dict | None:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
 def expand_input_pattern(
     input_path: str,
     root_dir: Path,
@@ -190,16 +496,27 @@ def expand_input_pattern(
     shuffle: bool = False,
     shuffle_seed: int | None = None,
     shuffle_buffer: int = 10000,
+    shuffle_mode: str = "block",
+    workers: int = 1,
+    exclude: List[Path] | None = None,
 ) -> Path:
     """
     Expand input path (directory or single file) and merge into a single file.
     
+    The merge is skipped when merge_output exists and its <merge_output>.sources.json
+    sidecar lists the same input files (path, mtime_ns, size) and shuffle
+    parameters; any added, removed or modified input re-merges.
+    
     Args:
         input_path: Directory path or single file path (glob patterns are not supported)
         root_dir: Root directory for resolving relative paths
         merge_files: If True (default), merge multiple files into one
         merge_output: Path to write merged file (if None, uses default location)
         required_json_keys: Optional list of keys that must be present in each JSON object
+        shuffle_mode: "block" or "window" (see merge_jsonl_files)
+        workers: Parallel writers for the merge (see merge_jsonl_files)
+        exclude: Generated files in the input directory that are not inputs
+            (merge_output itself is always excluded)
         
     Returns:
         Path to the input file (single file or merged file)
@@ -228,8 +545,19 @@ def expand_input_pattern(
         )
     
     if path.is_dir():
-        # Directory: find all .jsonl files
-        jsonl_files = sorted(path.glob("*.jsonl"))
+        # Directory: find all .jsonl files, excluding <name>_<idx>.jsonl partition
+        # files that preprocess_data.py writes next to <name>.jsonl when PARTITIONS > 1,
+        # and files this pipeline generated there (merged output, SFT rewrite)
+        if merge_output is None:
+            merge_output = path / "merged.jsonl"
+        excluded = {os.path.abspath(p) for p in [merge_output, *(exclude or [])]}
+        candidates = sorted(path.glob("*.jsonl"))
+        names = {p.name for p in candidates}
+        jsonl_files = [
+            p
+            for p in candidates
+            if not _is_partition_file(p.name, names) and os.path.abspath(p) not in excluded
+        ]
         if not jsonl_files:
             raise FileNotFoundError(f"No .jsonl files found in directory: {path}")
     else:
@@ -252,15 +580,225 @@ def expand_input_pattern(
         if merge_output is None:
             # Default: merge to first file's directory with "merged.jsonl" name
             merge_output = jsonl_files[0].parent / "merged.jsonl"
-        merge_jsonl_files(
-            jsonl_files,
-            merge_output,
-            required_keys=None,
-            shuffle=shuffle,
-            shuffle_seed=shuffle_seed,
-            shuffle_buffer=shuffle_buffer,
-        )
+        sources_path = merge_output.with_name(merge_output.name + MERGE_SOURCES_SUFFIX)
+        params = {"shuffle": str(shuffle)}
+        if shuffle:
+            params.update(seed=str(shuffle_seed), buffer=str(shuffle_buffer), mode=shuffle_mode)
+        sources = _merge_sources_record(jsonl_files, params)
+        if merge_output.exists() and _read_merge_sources(sources_path) == sources:
+            print(f"merge_jsonl: skipped (up-to-date) output={merge_output}")
+            return merge_output
+        # Stage into <merge_output>.part and rename on success, so an interrupted
+        # merge never leaves a truncated merge_output that reruns treat as done
+        merge_part = merge_output.with_name(merge_output.name + ".part")
+        try:
+            merge_jsonl_files(
+                jsonl_files,
+                merge_part,
+                required_keys=None,
+                shuffle=shuffle,
+                shuffle_seed=shuffle_seed,
+                shuffle_buffer=shuffle_buffer,
+                shuffle_mode=shuffle_mode,
+                workers=workers,
+            )
+            os.replace(merge_part, merge_output)
+        except BaseException:
+            try:
+                os.unlink(merge_part)
+            except FileNotFoundError:
+                pass
+            raise
+        sources_tmp = sources_path.with_name(sources_path.name + ".tmp")
+        sources_tmp.write_text(json.dumps(sources, ensure_ascii=False), encoding="utf-8")
+        os.replace(sources_tmp, sources_path)
         return merge_output
     else:
         # Single file, no required keys, no merge needed: return it directly
         return jsonl_files[0]
+
+
+def resolve_partitions(partitions_value: str, workers: int, workers_per_partition: int = 16) -> Tuple[int, int]:
+    """
+    Resolve (partitions, workers) for Megatron preprocess_data.py.
+
+    PARTITIONS="auto" -> max(1, nproc // WORKERS_PER_PARTITION), so each
+    partition gets its own process with workers // partitions tokenizer
+    workers. workers is rounded down to a multiple of partitions (and never
+    below it) since preprocess_data.py splits workers evenly.
+    """
+    if str(partitions_value).strip().lower() == "auto":
+        partitions = max(1, (os.cpu_count() or 1) // max(1, workers_per_partition))
+    else:
+        partitions = max(1, int(partitions_value))
+    if partitions > 1:
+        workers = max(partitions, workers - workers % partitions)
+    return partitions, workers
+
+
+def sha256_file(path: Path, block_size: int = HASH_BLOCK_SIZE) -> str:
+    """Streaming sha256 of a file."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            h.update(block)
+    return h.hexdigest()
+
+
+def sha256_files(paths: List[Path], max_workers: int = 8) -> Dict[str, str]:
+    """Hash files in parallel (I/O-bound, hashlib releases the GIL). Returns {path: hexdigest}."""
+    if not paths:
+        return {}
+    workers = max(1, min(max_workers, len(paths)))
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        digests = list(ex.map(sha256_file, paths))
+    return {str(p): d for p, d in zip(paths, digests)}
+
+
+def _path_fingerprint(path: Path) -> str:
+    """Cheap fingerprint (name/size/mtime) of a file or the top level of a directory."""
+    if not path.exists():
+        return f"{path}:missing"
+    if path.is_file():
+        st = path.stat()
+        return f"{path}:{st.st_size}:{st.st_mtime_ns}"
+    parts = [str(path)]
+    for child in sorted(path.iterdir()):
+        if child.is_file():
+            st = child.stat()
+            parts.append(f"{child.name}:{st.st_size}:{st.st_mtime_ns}")
+    return "|".join(parts)
+
+
+def tokenize_cache_key(
+    input_files: List[Path],
+    tokenizer_path: Path,
+    params: Dict[str, str],
+    *,
+    max_workers: int = 8,
+) -> str:
+    """
+    Cache key for tokenized outputs: content hash of input jsonl files,
+    tokenizer fingerprint (size/mtime) and the preprocess parameters.
+    """
+    h = hashlib.sha256()
+    digests = sha256_files(sorted(input_files), max_workers=max_workers)
+    for name in sorted(digests):
+        h.update(f"input={Path(name).name}:{digests[name]}\n".encode("utf-8"))
+    h.update(f"tokenizer={_path_fingerprint(tokenizer_path)}\n".encode("utf-8"))
+    for key in sorted(params):
+        h.update(f"{key}={params[key]}\n".encode("utf-8"))
+    return h.hexdigest()
+
+
+def tokenized_output_files(output_prefix: Path, json_keys: List[str]) -> List[Path]:
+    """Megatron preprocess_data.py outputs: <prefix>_<key>_document.{bin,idx} per json key."""
+    out: List[Path] = []
+    for key in json_keys:
+        base = f"{output_prefix}_{key}_document"
+        out.append(Path(base + ".bin"))
+        out.append(Path(base + ".idx"))
+    return out
+
+
+def tokenize_cache_path(output_prefix: Path) -> Path:
+    return Path(f"{output_prefix}.cachekey")
+
+
+def tokenize_cache_hit(output_prefix: Path, json_keys: List[str], key: str) -> bool:
+    """True if <prefix>.cachekey matches key and all bin/idx outputs exist."""
+    cache_path = tokenize_cache_path(output_prefix)
+    if not cache_path.exists():
+        return False
+    if cache_path.read_text(encoding="utf-8").strip() != key:
+        return False
+    return all(p.exists() for p in tokenized_output_files(output_prefix, json_keys))
+
+
+def write_tokenize_cache_key(output_prefix: Path, key: str) -> None:
+    cache_path = tokenize_cache_path(output_prefix)
+    tmp = cache_path.with_name(cache_path.name + ".tmp")
+    tmp.write_text(key + "\n", encoding="utf-8")
+    os.replace(tmp, cache_path)
+
+
+def clear_tokenize_cache_key(output_prefix: Path) -> None:
+    cache_path = tokenize_cache_path(output_prefix)
+    if cache_path.exists():
+        cache_path.unlink()
+
+
+def _mem_available_bytes() -> int | None:
+    """MemAvailable from /proc/meminfo, or None when unavailable (non-Linux)."""
+    try:
+        with open("/proc/meminfo", "r", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        return None
+    return None
+
+
+def _preload_range(path: Path, offset: int, size: int) -> int:
+    """Read [offset, offset+size) into a scratch buffer so the pages land in page cache."""
+    buf = bytearray(min(PRELOAD_CHUNK_SIZE, size))
+    view = memoryview(buf)
+    done = 0
+    with open(path, "rb", buffering=0) as f:
+        fd = f.fileno()
+        while done < size:
+            n = os.preadv(fd, [view[: min(len(buf), size - done)]], offset + done)
+            if n <= 0:
+                break
+            done += n
+    return done
+
+
+def preload_page_cache(paths: List[Path], *, max_workers: int = 8, ram_fraction: float = 0.5) -> int:
+    """
+    Warm the page cache for tokenized outputs so the following train step does
+    not pay the cold read. posix_fadvise(WILLNEED) starts kernel readahead, then
+    the files are read in PRELOAD_CHUNK_SIZE ranges on a thread pool (preadv
+    releases the GIL). The total is capped at ram_fraction * MemAvailable so a
+    large corpus does not evict everything else. Returns bytes preloaded.
+    """
+    existing = [p for p in paths if p.is_file()]
+    if not existing:
+        return 0
+    available = _mem_available_bytes()
+    budget = int(available * ram_fraction) if available is not None else sum(p.stat().st_size for p in existing)
+
+    ranges: List[Tuple[Path, int, int]] = []
+    for path in existing:
+        size = min(path.stat().st_size, budget)
+        if size <= 0:
+            break
+        budget -= size
+        if hasattr(os, "posix_fadvise"):
+            fd = os.open(path, os.O_RDONLY)
+            try:
+                os.posix_fadvise(fd, 0, size, os.POSIX_FADV_WILLNEED)
+            finally:
+                os.close(fd)
+        for offset in range(0, size, PRELOAD_CHUNK_SIZE):
+            ranges.append((path, offset, min(PRELOAD_CHUNK_SIZE, size - offset)))
+    if not ranges:
+        return 0
+
+    workers = max(1, min(max_workers, len(ranges)))
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        return sum(ex.map(lambda r: _preload_range(*r), ranges))
+
+
+def preload_tokenized_outputs(output_prefix: Path, json_keys: List[str], workers: int, preload_bin: str = "0") -> None:
+    """PRELOAD_BIN=1: warm page cache with the .bin/.idx outputs for the train step."""
+    if str(preload_bin) != "1":
+        return
+    files = tokenized_output_files(output_prefix, json_keys)
+    t0 = time.time()
+    nbytes = preload_page_cache(files, max_workers=max(1, workers))
+    print(f"preload_bin: bytes={nbytes} files={len(files)} elapsed={time.time() - t0:.1f}s")
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Regression checks for merge_jsonl_files: the raw-concat fast path must match
+the line-normalizing merge (strip each line, skip empty ones).
+
+Run: python -m unittest discover -s tests
+"""
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts" / "utils"))
+from tokenize_utils import _scan_jsonl_for_concat, merge_jsonl_files
+
+
+class MergeJsonlFilesTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _write(self, name: str, data: bytes) -> Path:
+        path = self.root / name
+        path.write_bytes(data)
+        return path
+
+    def _merge(self, *parts: bytes, workers: int = 2):
+        files = [self._write(f"{i}.jsonl", data) for i, data in enumerate(parts)]
+        out = self.root / "merged.jsonl"
+        lines = merge_jsonl_files(files, out, workers=workers)
+        return lines, out.read_bytes()
+
+    def test_whitespace_only_and_crlf(self):
+        lines, data = self._merge(b"   ", b'{"t":1}\r\n{"t":2}\n', b'{"t":3}')
+        self.assertEqual(lines, 3)
+        self.assertEqual(data, b'{"t":1}\n{"t":2}\n{"t":3}\n')
+
+    def test_matches_normalizing_merge(self):
+        parts = (b'  {"t":1}\n', b'{"t":2}  \n\n', b'\t\n{"t":3}\n \n', b'{"t":4}\r{"t":5}')
+        self.assertEqual(self._merge(*parts, workers=2), self._merge(*parts, workers=1))
+        self.assertEqual(self._merge(*parts)[0], 5)
+
+    def test_clean_files_take_fast_path(self):
+        clean = self._write("a.jsonl", b'{"t":1}\n{"t":2}')
+        self.assertEqual(_scan_jsonl_for_concat(clean), (15, 2, True))
+        for bad in (b"   ", b"\n", b'{"t":1}\r\n', b' {"t":1}\n', b'{"t":1} \n', b'{"t":1}\n\n{"t":2}\n'):
+            self.assertIsNone(_scan_jsonl_for_concat(self._write("b.jsonl", bad)), bad)
+        lines, data = self._merge(b'{"t":1}\n', b'{"t":2}')
+        self.assertEqual((lines, data), (2, b'{"t":1}\n{"t":2}\n'))
+
+
+if __name__ == "__main__":
+    unittest.main()